@@ -1,12 +1,13 @@
 import asyncio
-import os
 import subprocess
 
 import strapi_models as M
+from scratch import get_scratch
+from strapi_client import get_client
+from strapi_query import Q
 
 
-def extract_audio(video_url):
-    output_path = "./temp.mp3"
+def extract_audio(video_url, output_path):
     ffmpeg_command = [
         "ffmpeg",
         "-y",
@@ -19,16 +20,22 @@ def extract_audio(video_url):
 
 
 async def main():
-    all_videos = await M.PostCourseVideo.all()
-    print(f"got {len(all_videos)} videos")
-    all_videos = [i for i in all_videos if not i.audio_file and i.video_file]
-    print(f"{len(all_videos)} videos are missing audio")
-    for video in all_videos:
-        print(video.id)
-        audio_path = extract_audio(video.video_file.url)
-        video.audio_file = await M.Media.upload_file(audio_path)
-        await video.put()
-        os.remove(audio_path)
+    async with get_client():
+        count = 0
+        async for video in M.PostCourseVideo.iter(
+            fields=["title"],
+            populate={"video_file": ["url"], "audio_file": ["url"]},
+            filters=Q(audio_file__id__null=True, video_file__id__notNull=True),
+        ):
+            count += 1
+            print(video.id)
+            async with get_scratch().job(f"audio-{video.id}") as scratch:
+                audio_path = await asyncio.to_thread(
+                    extract_audio, video.video_file.url, scratch.file("audio.mp3")
+                )
+                video.audio_file = await M.Media.upload_file(audio_path)
+            await video.put()
+        print(f"{count} videos were missing audio")
 
 
 if __name__ == "__main__":
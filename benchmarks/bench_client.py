@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STRAPI_URL", "http://localhost:1337")
+
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+import strapi_client  # noqa: E402
+import strapi_models as M  # noqa: E402
+import upload_index  # noqa: E402
+from fake_strapi import FakeStrapi, default_models  # noqa: E402
+from strapi_client import StrapiClient  # noqa: E402
+from upload_index import UploadIndex  # noqa: E402
+
+
+def seed(fake: FakeStrapi, rows: int):
+    course = fake.insert("courses", {"title": "course"})
+    category = fake.insert(
+        "course-categories", {"name": "category", "course": course["id"]}
+    )
+    subcategory = fake.insert(
+        "course-subcategories",
+        {"name": "subcategory", "course_category": category["id"]},
+    )
+    for i in range(rows):
+        video = fake.add_file(f"{i}.mp4", b"", "video/mp4")
+        audio = fake.add_file(f"{i}.mp3", b"", "audio/mpeg")
+        fake.insert(
+            "post-course-videos",
+            {
+                "title": f"video {i}",
+                "episode": i,
+                "transcript": "lorem ipsum " * 50,
+                "video_file": video["id"],
+                "audio_file": audio["id"],
+                "course_subcategory": subcategory["id"],
+            },
+        )
+
+
+async def scenario_all(ctx):
+    videos = await M.PostCourseVideo.all()
+    return len(videos)
+
+
+async def scenario_get_or_create(ctx):
+    names = [f"author {i % (ctx.n // 2 or 1)}" for i in range(ctx.n)]
+    for name in names:
+        await M.Author.get_or_create(name=name)
+    return len(names)
+
+
+async def scenario_post(ctx):
+    authors = [M.Author(name=f"new {i}") for i in range(ctx.n)]
+    count = 0
+    async for result in M.Author.bulk_create(authors, concurrency=ctx.concurrency):
+        count += result.ok
+    return count
+
+
+async def scenario_put(ctx):
+    videos = await M.PostCourseVideo.all(fields=["title"])
+    ctx.fake.requests = 0
+    for video in videos:
+        video.title = video.title + "!"
+    count = 0
+    async for result in M.PostCourseVideo.bulk_update(
+        videos, concurrency=ctx.concurrency
+    ):
+        count += result.ok
+    return count
+
+
+async def scenario_upload(ctx):
+    count = 0
+    for path in ctx.files:
+        count += (await M.Media.upload_file(path)) is not None
+    return count
+
+
+SCENARIOS = {
+    "all": scenario_all,
+    "get_or_create": scenario_get_or_create,
+    "post": scenario_post,
+    "put": scenario_put,
+    "upload": scenario_upload,
+}
+
+
+class Context:
+    def __init__(self, args, fake, files):
+        self.n = args.n
+        self.concurrency = args.concurrency
+        self.fake = fake
+        self.files = files
+
+
+async def run(name, args, files, trace_memory):
+    fake = FakeStrapi(
+        default_models(), latency=args.latency, error_rate=args.error_rate
+    )
+    seed(fake, args.rows)
+    server = TestServer(fake.app())
+    await server.start_server()
+    client = StrapiClient(base_url=str(server.make_url("")).rstrip("/"))
+    strapi_client.set_client(client)
+    try:
+        ctx = Context(args, fake, files)
+        fake.requests = 0
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        objects = await SCENARIOS[name](ctx)
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return fake.requests, objects, elapsed, peak, client.stats
+    finally:
+        await client.close()
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("-n", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--upload-size", type=int, default=1024 * 1024)
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        upload_index.set_index(UploadIndex(os.path.join(tmp, "index.sqlite3")))
+        files = []
+        for i in range(args.uploads):
+            path = os.path.join(tmp, f"{i}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(args.upload_size))
+            files.append(path)
+        print(
+            f"{'scenario':>14} {'req/s':>9} {'obj/s':>10} {'MB/s':>7}"
+            f" {'peak MB':>8} {'reused':>7}"
+        )
+        for name in args.scenarios:
+            requests, objects, elapsed, _, stats = asyncio.run(
+                run(name, args, files, trace_memory=False)
+            )
+            _, _, _, peak, _ = asyncio.run(run(name, args, files, trace_memory=True))
+            mb = args.upload_size * objects / 1e6 if name == "upload" else 0
+            print(
+                f"{name:>14} {requests / elapsed:>9.0f} {objects / elapsed:>10.0f}"
+                f" {mb / elapsed:>7.1f} {peak / 1e6:>8.1f}"
+                f" {stats.reused:>3}/{stats.opened + stats.reused:<3}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a fresh interpreter each time so nothing is already imported; prints
+# the time taken, whether a browser or its tooling came along, and the error
+# if starting one failed
+PROBE = """
+import sys, time
+start = time.perf_counter()
+error = "-"
+try:
+    import {module}
+{eager}except Exception as e:
+    error = type(e).__name__
+elapsed = time.perf_counter() - start
+kartra_api = sys.modules.get("kartra_api")
+driver = getattr(kartra_api, "_driver", None)
+print(elapsed, "webdriver_manager" in sys.modules, driver is not None, error)
+if driver is not None:
+    kartra_api.close_driver()
+"""
+
+# what importing kartra_api used to do: resolve chromedriver through
+# webdriver_manager and launch chrome
+EAGER = """\
+    import kartra_api
+    kartra_api.get_driver()
+"""
+
+
+def measure(module: str, runs: int, eager: bool):
+    env = {"STRAPI_URL": "http://localhost:1337", **os.environ}
+    if eager:
+        env.pop("CHROMEDRIVER_PATH", None)
+    times = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, eager=EAGER * eager)],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            error = result.stderr.strip().splitlines()[-1]
+            print(f"{module}: probe failed: {error}")
+            return None
+        elapsed, manager, driver, error = result.stdout.split()[-4:]
+        times.append(float(elapsed))
+    median = statistics.median(times)
+    print(
+        f"{module} ({'eager' if eager else 'lazy'}):"
+        f" median {median * 1000:.0f} ms, min {min(times) * 1000:.0f} ms"
+        f" over {runs} runs, webdriver_manager imported: {manager},"
+        f" browser started: {driver}"
+        + (f", failed with {error} (so at least this long)" if error != "-" else "")
+    )
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=["kartra_api", "main"])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    for module in args.modules:
+        eager = measure(module, args.runs, eager=True)
+        lazy = measure(module, args.runs, eager=False)
+        if eager and lazy:
+            print(f"{module}: import is {eager / lazy:.1f}x faster without a browser")
+
+
+if __name__ == "__main__":
+    main()
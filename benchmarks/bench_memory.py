@@ -0,0 +1,115 @@
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STRAPI_URL", "http://localhost:1337")
+
+import strapi_models as M  # noqa: E402
+
+
+def media(id: int, ext: str, mime: str, formats: bool) -> dict:
+    attributes = {
+        "name": f"{id}{ext}",
+        "alternativeText": None,
+        "caption": None,
+        "width": 1920 if formats else None,
+        "height": 1080 if formats else None,
+        "formats": None,
+        "hash": f"file_{id:08x}",
+        "ext": ext,
+        "mime": mime,
+        "size": 1063.89,
+        "url": f"https://csj-cdn.sfo3.cdn.digitaloceanspaces.com/file_{id:08x}{ext}",
+        "previewUrl": None,
+        "provider": "aws-s3",
+        "provider_metadata": None,
+        "createdAt": "2024-01-26T07:08:04.284Z",
+        "updatedAt": "2024-01-28T05:12:37.606Z",
+    }
+    if formats:
+        attributes["formats"] = {
+            name: {
+                "ext": ext,
+                "url": f"https://csj-cdn.sfo3.cdn.digitaloceanspaces.com/"
+                f"{name}_file_{id:08x}{ext}",
+                "hash": f"{name}_file_{id:08x}",
+                "mime": mime,
+                "name": f"{name}_{id}{ext}",
+                "path": None,
+                "size": 12.5,
+                "width": width,
+                "height": width * 9 // 16,
+            }
+            for name, width in (
+                ("thumbnail", 245),
+                ("small", 500),
+                ("medium", 750),
+                ("large", 1000),
+            )
+        }
+        attributes["provider_metadata"] = {
+            "public_id": f"file_{id:08x}",
+            "resource_type": "image",
+        }
+    return {"data": {"id": id, "attributes": attributes}}
+
+
+def row(id: int) -> dict:
+    return {
+        "id": id,
+        "attributes": {
+            "title": f"video {id}",
+            "full_title": f"course / category / video {id}",
+            "createdAt": "2024-01-28T12:40:44.736Z",
+            "updatedAt": "2024-01-28T12:40:55.889Z",
+            "publishedAt": "2024-01-28T12:40:55.886Z",
+            "transcript": None,
+            "episode": id % 12,
+            "video_file": media(5 * id, ".mp4", "video/mp4", False),
+            "audio_file": media(5 * id + 1, ".mp3", "audio/mpeg", False),
+            "thumbnail": media(5 * id + 2, ".jpg", "image/jpeg", True),
+            "first_frame": media(5 * id + 3, ".png", "image/png", True),
+            "misc_files": {
+                "data": [media(5 * id + 4, ".pdf", "application/pdf", False)["data"]]
+            },
+        },
+    }
+
+
+def hydrate(pages: list) -> list:
+    videos = []
+    for page in pages:
+        videos.extend(M.PostCourseVideo(**item) for item in json.loads(page))
+    return videos
+
+
+def main(n: int = 50_000, page_size: int = 100):
+    # hydrate from freshly parsed pages, as fetch_page does, so whatever the
+    # models keep of the response counts against them
+    pages = [
+        json.dumps([row(i) for i in range(start, min(start + page_size, n))])
+        for start in range(0, n, page_size)
+    ]
+    start = time.perf_counter()
+    hydrate(pages)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    videos = hydrate(pages)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{len(videos)} rows hydrated in {elapsed:.2f}s")
+    print(f"retained: {current / 1e6:.1f} MB ({current / n:.0f} bytes/row)")
+    print(f"peak: {peak / 1e6:.1f} MB")
+    start = time.perf_counter()
+    thumbnails = sum(len(v.thumbnail.formats) for v in videos)
+    print(f"read {thumbnails} formats in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,159 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kartra_parser as P  # noqa: E402
+from page_cache import DEFAULT_PATH, PageCache  # noqa: E402
+
+KINDS = {
+    "index": P.INDEX_MARKER,
+    "subcategory": P.SUBCATEGORY_MARKER,
+    "post": P.POST_MARKER,
+}
+
+
+def chrome(n: int) -> str:
+    # the page furniture that surrounds the part the parsers want: scripts,
+    # styles, a sidebar and comment threads, roughly the size of a real page
+    blocks = [
+        "<script>window.kartra = {" + ", ".join(f"k{i}: {i}" for i in range(200))
+        + "};</script>",
+        "<style>" + " ".join(f".c{i} {{ margin: {i}px; }}" for i in range(300))
+        + "</style>",
+    ]
+    for i in range(n):
+        blocks.append(
+            f"<div class='panel panel-default comment' id='c{i}'>"
+            f"<div class='panel-heading'><img src='/a/{i}.png' alt='avatar'>"
+            f"<b>member {i}</b> <span class='time'>{i} days ago</span></div>"
+            f"<div class='panel-body'><p>{'lorem ipsum dolor sit amet ' * 8}</p>"
+            f"<ul><li><a href='#like{i}'>like</a></li>"
+            f"<li><a href='#reply{i}'>reply</a></li></ul></div></div>"
+        )
+    return "".join(blocks)
+
+
+def page(body: str, n: int = 150) -> str:
+    return (
+        "<!DOCTYPE html><html><head><title>Course</title></head><body>"
+        f"{chrome(n // 2)}{body}{chrome(n // 2)}</body></html>"
+    )
+
+
+def synthetic_pages() -> dict:
+    categories = "".join(
+        f"<li class='dropdown'><a href='#'>Category {c}</a><ul class='dropdown-menu'>"
+        + "".join(
+            f"<li><a href='/portal/x/{'post' if s % 4 == 0 else 'subcategory'}/"
+            f"{c * 100 + s}'><span class='dropdown_title'>Item {s}</span></a></li>"
+            for s in range(12)
+        )
+        + "</ul></li>"
+        for c in range(10)
+    )
+    posts = "".join(
+        f"<li class='js_menu_item_navigation_element' data-item_id='{i}'>"
+        f"<a><i class='icon'></i><span>Post {i}</span></a></li>"
+        for i in range(40)
+    )
+    return {
+        "index": [page(f"<ul class='nav list-unstyled'>{categories}</ul>")],
+        "subcategory": [
+            page(
+                "<div class='panel panel-blank menu_box'><div class='panel-heading'>"
+                f"Subcategory</div><div class='panel-body'><ul>{posts}</ul>"
+                "</div></div>"
+            )
+        ],
+        "post": [
+            page(
+                "<div class='panel panel-kartra'><h1>Post</h1>"
+                "<div class='video'><div data-video_source='vimeo'"
+                " data-video_source_id='123456789'></div></div>"
+                f"<p>{'transcript ' * 500}</p></div>"
+            )
+        ],
+    }
+
+
+def classify(pages: dict, html: str, name: str):
+    # by url (or file name) first, since the portal's nav may be on every page
+    for kind in KINDS:
+        if kind in name:
+            pages[kind].append(html)
+            return
+    for kind, marker in KINDS.items():
+        if f'class="{marker}"' in html or f"class='{marker}'" in html:
+            pages[kind].append(html)
+            return
+
+
+def cached_pages(path: str) -> dict:
+    pages = {kind: [] for kind in KINDS}
+    cache = PageCache(path)
+    for (url,) in cache.db.execute("SELECT url FROM pages").fetchall():
+        html = cache.get(url).html
+        if html:
+            classify(pages, html, url)
+    cache.close()
+    return pages
+
+
+def saved_pages(directory: str) -> dict:
+    pages = {kind: [] for kind in KINDS}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path) as f:
+            classify(pages, f.read(), os.path.basename(path))
+    return pages
+
+
+def bench(parse, pages, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parse(html)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", default=DEFAULT_PATH, help="page cache to read")
+    parser.add_argument("--dir", help="directory of saved .html portal pages")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.dir:
+        pages, source = saved_pages(args.dir), args.dir
+    elif os.path.exists(args.cache):
+        pages, source = cached_pages(args.cache), args.cache
+    else:
+        pages, source = synthetic_pages(), "synthetic pages"
+    print(f"parsing {source}")
+    parsers = {name: P.PARSERS[name]() for name in P.available_parsers()}
+    reference = parsers["html.parser"]
+    for kind, htmls in pages.items():
+        if not htmls:
+            continue
+        size = sum(map(len, htmls)) / len(htmls) / 1000
+        print(f"{kind}: {len(htmls)} pages, {size:.0f} KB each")
+        expected = [getattr(reference, kind)(html) for html in htmls]
+        timings = {
+            name: bench(getattr(backend, kind), htmls, args.repeat)
+            for name, backend in parsers.items()
+        }
+        for name, seconds in timings.items():
+            parse = getattr(parsers[name], kind)
+            same = [parse(html) for html in htmls] == expected
+            print(
+                f"  {name:>12}: {seconds * 1000:7.2f} ms/page"
+                f" {timings['html.parser'] / seconds:5.1f}x"
+                f"{'' if same else '  OUTPUT DIFFERS'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import time
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+KARTRA_URL = "https://csjoseph.kartra.com/portal"
+
+
+def chrome_options() -> Options:
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-extensions")
+    return options
+
+
+@lru_cache(maxsize=None)
+def chromedriver_path() -> str:
+    # resolved once per process rather than once per browser; the
+    # webdriver_manager import is deferred too, since it loads .env and
+    # requests at import
+    path = os.getenv("CHROMEDRIVER_PATH")
+    if path:
+        return path
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    return ChromeDriverManager().install()
+
+
+def create_driver(cookies: Dict[str, str], url: str = KARTRA_URL):
+    print("creating driver")
+    driver = webdriver.Chrome(
+        options=chrome_options(),
+        service=Service(chromedriver_path()),
+    )
+    # cookies can only be set for the domain the browser is on
+    driver.get(url)
+    for name, value in cookies.items():
+        driver.add_cookie({"name": name, "value": value})
+    print("created")
+    return driver
+
+
+def render(driver, url: str) -> Optional[str]:
+    print(f"getting {url}")
+    driver.get(url)
+    is_404 = driver.execute_script(
+        "return document.title.includes('404')"
+        " || document.body.innerText.includes('404 Not Found');"
+    )
+    if is_404:
+        return None
+    return driver.page_source
+
+
+def process_tree_rss(pid: int) -> int:
+    # resident bytes of pid and everything below it (chromedriver -> chrome
+    # -> renderers), from /proc; 0 where that isn't available
+    children: Dict[int, List[int]] = {}
+    try:
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(name))
+    except OSError:
+        return 0
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, ()))
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+
+class BrowserWorker:
+    def __init__(self, number: int, driver):
+        self.number = number
+        self.driver = driver
+        self.pages = 0
+        self.seconds = 0.0
+
+    def memory(self) -> int:
+        service = getattr(self.driver, "service", None)
+        process = getattr(service, "process", None)
+        return process_tree_rss(process.pid) if process is not None else 0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"browser {self.number} did not quit cleanly: {e!r}")
+
+    def __str__(self) -> str:
+        rate = self.pages / self.seconds if self.seconds else 0.0
+        return (
+            f"browser {self.number}: {self.pages} pages, {rate:.2f} pages/s,"
+            f" {self.memory() / 1e6:.0f} MB"
+        )
+
+
+class BrowserPool:
+    # up to size headless browsers, started on demand with the session
+    # cookies set once each. A browser that crashes is replaced and the page
+    # retried once; one that has rendered max_pages pages or grown past
+    # max_memory bytes is replaced after its current page, since chrome
+    # leaks over long runs
+    def __init__(
+        self,
+        cookies: Dict[str, str],
+        size: int = 2,
+        max_pages: int = 200,
+        max_memory: int = 1500 * 1024**2,
+        factory: Callable = create_driver,
+    ):
+        self.cookies = cookies
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.factory = factory
+        self.idle: List[BrowserWorker] = []
+        # notified when a browser goes idle or a slot frees up, including
+        # when a start fails, so waiters can take the slot and try themselves
+        self.available = asyncio.Condition()
+        self.workers: List[BrowserWorker] = []
+        self.starting = 0
+        self.started = 0
+        self.recycled = 0
+
+    async def _start(self, old: Optional[BrowserWorker] = None) -> BrowserWorker:
+        # the caller has already counted the slot in self.starting so others
+        # don't also take it during the slow start; if the start fails, the
+        # slot is handed to a waiter, which then tries for itself
+        try:
+            if old is not None:
+                await asyncio.to_thread(old.quit)
+            self.started += 1
+            driver = await asyncio.to_thread(self.factory, self.cookies)
+        except BaseException:
+            self.starting -= 1
+            async with self.available:
+                self.available.notify()
+            raise
+        self.starting -= 1
+        worker = BrowserWorker(self.started, driver)
+        self.workers.append(worker)
+        return worker
+
+    async def _acquire(self) -> BrowserWorker:
+        async with self.available:
+            while not self.idle and len(self.workers) + self.starting >= self.size:
+                await self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.starting += 1
+        return await self._start()
+
+    async def _release(self, worker: BrowserWorker):
+        async with self.available:
+            self.idle.append(worker)
+            self.available.notify()
+
+    async def _replace(self, worker: BrowserWorker) -> BrowserWorker:
+        self.recycled += 1
+        self.workers.remove(worker)
+        self.starting += 1
+        return await self._start(old=worker)
+
+    async def fetch(self, url: str) -> Optional[str]:
+        worker = await self._acquire()
+        try:
+            for attempt in range(2):
+                start = time.monotonic()
+                try:
+                    html = await asyncio.to_thread(render, worker.driver, url)
+                except WebDriverException as e:
+                    print(f"browser {worker.number} crashed on {url}: {e.msg}")
+                    worker = await self._replace(worker)
+                    if attempt:
+                        raise
+                    continue
+                worker.pages += 1
+                worker.seconds += time.monotonic() - start
+                break
+            if worker.pages >= self.max_pages or worker.memory() > self.max_memory:
+                print(f"recycling {worker}")
+                worker = await self._replace(worker)
+            return html
+        finally:
+            if worker in self.workers:
+                await self._release(worker)
+
+    def report(self):
+        for worker in self.workers:
+            print(worker)
+        print(f"{self.started} browsers started, {self.recycled} recycled")
+
+    async def close(self):
+        workers, self.workers, self.idle = self.workers, [], []
+        await asyncio.gather(*(asyncio.to_thread(w.quit) for w in workers))
+
+    async def __aenter__(self) -> "BrowserPool":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -5,8 +5,10 @@ from datetime import datetime
 
 import pytz
 from dateutil.parser import ParserError, parse
+from tqdm import tqdm
 
 import strapi_models as M
+from strapi_client import get_client
 import vimeo_download
 from vimeo_download import get_videos_from_folder
 
@@ -77,11 +79,21 @@ async def migrate_videos():
             continue
         print(video.name, video.id, video.uri, video.file_path)
         video.download()
+        with tqdm(
+            total=os.path.getsize(video.file_path),
+            unit="B",
+            unit_scale=True,
+            desc="Uploading",
+        ) as pbar:
+            videofile = await M.Media.upload_file(
+                video.file_path,
+                progress=lambda sent, _: pbar.update(sent - pbar.n),
+            )
         await M.CoachingReplay(
             name=os.path.splitext(os.path.split(video.file_path)[1])[0],
             coach=7,
             recording_date=None,
-            videofile=await M.Media.upload_file(video.file_path),
+            videofile=videofile,
         ).post()
         print("done uploading\n\n")
 
@@ -159,34 +171,43 @@ def extract_name(name_str):
     return name_str, type, octagram, date_obj
 
 
+def retitle(video: M.CoachingReplay) -> M.CoachingReplay:
+    name, type, octagram, recording_date = extract_name(video.name)
+    print()
+    print(video.name)
+    print(name)
+    pst = pytz.timezone("America/Los_Angeles")
+    if recording_date:
+        recording_date = pst.localize(recording_date)
+        recording_date = M.Datetime.from_datetime(recording_date)
+    video.name = name
+    if type:
+        video.type = type
+    if octagram:
+        video.octagram = octagram
+    if video.recording_date is not None and video.recording_date > pst.localize(
+        datetime(2024, 3, 28)
+    ):
+        video.recording_date = None
+    if recording_date:
+        video.recording_date = recording_date
+    print(video.recording_date)
+    return video
+
+
 async def parse_titles():
-    for video in await M.CoachingReplay.all():
-        name, type, octagram, recording_date = extract_name(video.name)
-        print()
-        print(video.name)
-        print(name)
-        pst = pytz.timezone("America/Los_Angeles")
-        if recording_date:
-            recording_date = pst.localize(recording_date)
-            recording_date = M.Datetime.from_datetime(recording_date)
-        video.name = name
-        if type:
-            video.type = type
-        if octagram:
-            video.octagram = octagram
-        if video.recording_date is not None and video.recording_date > pst.localize(
-            datetime(2024, 3, 28)
-        ):
-            video.recording_date = None
-        if recording_date:
-            video.recording_date = recording_date
-        print(video.recording_date)
-        await video.put()
+    videos = await M.CoachingReplay.all()
+    async for result in M.CoachingReplay.bulk_update(
+        (retitle(video) for video in videos), concurrency=10
+    ):
+        if not result.ok:
+            print(f"Failed to update {result.obj.id}: {result.error}")
 
 
 async def main():
-    await migrate_videos()
-    await parse_titles()
+    async with get_client():
+        await migrate_videos()
+        await parse_titles()
 
 
 if __name__ == "__main__":
@@ -4,13 +4,16 @@ import os
 import subprocess
 import time
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Optional
 
 import aiofiles
 import aiohttp
 from tqdm import tqdm
 
 import strapi_models as M
+from scratch import get_scratch
+from strapi_client import get_client
+from strapi_query import Q
 
 
 @dataclass
@@ -77,7 +80,9 @@ async def download_video(url: str, output_path: str):
             pbar.close()
 
 
-def convert_mov_to_mp4(input_path: str, output_path: str = "./temp.mp4"):
+def convert_mov_to_mp4(input_path: str, output_path: Optional[str] = None):
+    if output_path is None:
+        output_path = os.path.splitext(input_path)[0] + ".mp4"
     video_info = get_video_info(input_path)
     ffmpeg_command = [
         "ffmpeg",
@@ -117,36 +122,33 @@ def convert_mov_to_mp4(input_path: str, output_path: str = "./temp.mp4"):
 
 
 async def main():
-    all_videos = await M.PostCourseVideo.all()
-    print(f"got {len(all_videos)} videos")
-    all_videos = [
-        i
-        for i in all_videos
-        if i.video_file and i.video_file.url.lower().endswith(".mov")
-    ]
-    print(f"{len(all_videos)} videos are .mov")
-    for video in all_videos:
-        video_path = f"./temp_{video.id}.mov"
-        await download_video(video.video_file.url, video_path)
-        video_info = get_video_info(video_path)
-        video_needs_conversion = any(
-            stream.codec_name != "h264"
-            for stream in video_info.streams
-            if stream.codec_type == "video"
-        )
-        if video_needs_conversion:
-            print(f"Converting video {video.id}")
-            converted_video_path = convert_mov_to_mp4(video_path)
-            print("Video converted")
-            file = await M.Media.upload_file(converted_video_path)
-            assert file is not None
-            video.video_file = file
-            print("Video uploaded")
-            await video.put()
-            os.remove(converted_video_path)
-        else:
-            print(f"Skipping conversion for video {video.id}, already h264.")
-        os.remove(video_path)
+    async with get_client():
+        async for video in M.PostCourseVideo.iter(
+            fields=["title"],
+            populate={"video_file": ["url"]},
+            filters=Q(video_file__ext__eqi=".mov"),
+        ):
+            # the .mov and its conversion both live in the job's scratch dir
+            async with get_scratch().job(f"convert-{video.id}") as scratch:
+                video_path = scratch.file(f"{video.id}.mov")
+                await download_video(video.video_file.url, video_path)
+                video_info = get_video_info(video_path)
+                video_needs_conversion = any(
+                    stream.codec_name != "h264"
+                    for stream in video_info.streams
+                    if stream.codec_type == "video"
+                )
+                if video_needs_conversion:
+                    print(f"Converting video {video.id}")
+                    converted_video_path = convert_mov_to_mp4(video_path)
+                    print("Video converted")
+                    file = await M.Media.upload_file(converted_video_path)
+                    assert file is not None
+                    video.video_file = file
+                    print("Video uploaded")
+                    await video.put()
+                else:
+                    print(f"Skipping conversion for video {video.id}, already h264.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+import asyncio
+import mimetypes
+import os
+import re
+import secrets
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from upload_stream import ProgressCallback
+
+# Strapi has no public route for creating a file entry that already lives
+# in the bucket, so the server needs a small custom route that does
+# strapi.entityService.create("plugin::upload.file", {data}) and returns it
+REGISTER_PATH = os.getenv("STRAPI_UPLOAD_REGISTER_PATH", "/api/upload/register")
+
+
+class RegisterRouteMissing(Exception):
+    pass
+
+
+@dataclass
+class BucketConfig:
+    bucket: str
+    public_url: str
+    endpoint_url: Optional[str] = None
+    region: Optional[str] = None
+    access_key_id: Optional[str] = None
+    secret_access_key: Optional[str] = None
+    prefix: str = ""
+    part_size: int = 64 * 1024 * 1024
+    concurrency: int = 8
+
+    @classmethod
+    def from_env(cls) -> "BucketConfig":
+        bucket = os.getenv("S3_BUCKET")
+        public_url = os.getenv("S3_PUBLIC_URL")
+        assert bucket and public_url, "S3_BUCKET and S3_PUBLIC_URL must be set"
+        return cls(
+            bucket=bucket,
+            public_url=public_url.rstrip("/"),
+            endpoint_url=os.getenv("S3_ENDPOINT"),
+            region=os.getenv("S3_REGION"),
+            access_key_id=os.getenv("S3_ACCESS_KEY_ID"),
+            secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+            prefix=os.getenv("S3_PREFIX", ""),
+        )
+
+    def s3_client(self):
+        import boto3
+
+        return boto3.client(
+            "s3",
+            endpoint_url=self.endpoint_url,
+            region_name=self.region,
+            aws_access_key_id=self.access_key_id,
+            aws_secret_access_key=self.secret_access_key,
+        )
+
+
+def strapi_hash(file_name: str) -> str:
+    # same shape as the hashes strapi generates: sanitized name + random hex
+    base = os.path.splitext(file_name)[0]
+    return f"{re.sub(r'[^A-Za-z0-9]', '_', base)}_{secrets.token_hex(5)}"
+
+
+def put_object(
+    config: BucketConfig,
+    file_path: str,
+    key: str,
+    mime: str,
+    progress: Optional[ProgressCallback],
+):
+    from boto3.s3.transfer import TransferConfig
+
+    size = os.path.getsize(file_path)
+    sent = 0
+    # multipart parts report from several transfer threads at once
+    lock = threading.Lock()
+
+    def callback(n: int):
+        nonlocal sent
+        with lock:
+            sent += n
+            done = sent
+        if progress is not None:
+            progress(done, size)
+
+    config.s3_client().upload_file(
+        file_path,
+        config.bucket,
+        key,
+        ExtraArgs={"ACL": "public-read", "ContentType": mime},
+        Config=TransferConfig(
+            multipart_threshold=config.part_size,
+            multipart_chunksize=config.part_size,
+            max_concurrency=config.concurrency,
+        ),
+        Callback=callback,
+    )
+
+
+async def direct_upload(
+    client,
+    file_path: str,
+    config: Optional[BucketConfig] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    config = config or BucketConfig.from_env()
+    loop = asyncio.get_running_loop()
+    name = os.path.basename(file_path)
+    ext = os.path.splitext(name)[1]
+    mime = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    file_hash = strapi_hash(name)
+    key = f"{config.prefix}{file_hash}{ext}"
+    if progress is not None:
+        # boto3 reports from its worker threads
+        user_progress = progress
+
+        def progress(sent: int, total: int):
+            loop.call_soon_threadsafe(user_progress, sent, total)
+
+    await asyncio.to_thread(put_object, config, file_path, key, mime, progress)
+    data = {
+        "name": name,
+        "hash": file_hash,
+        "ext": ext,
+        "mime": mime,
+        "size": round(os.path.getsize(file_path) / 1000, 2),
+        "url": f"{config.public_url}/{key}",
+        "provider": "aws-s3",
+    }
+    async with client.post(REGISTER_PATH, json={"data": data}) as response:
+        if response.status == 404:
+            raise RegisterRouteMissing(
+                f"{REGISTER_PATH} not found on Strapi: add the register route"
+                " or point STRAPI_UPLOAD_REGISTER_PATH at it"
+                f" ({file_path} is already in the bucket as {key})"
+            )
+        if response.status != 200:
+            raise Exception(f"{response.status} - {await response.text()}")
+        return await response.json()
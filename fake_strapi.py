@@ -0,0 +1,438 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+from aiohttp import web
+
+from strapi_object import StrapiObject
+from strapi_query import relations
+
+UPLOAD = "upload"
+DEEP_DEPTH = 2
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def parse_nested(query, root: str) -> Any:
+    # filters[a][b][$eq]=1 -> {"a": {"b": {"$eq": "1"}}}, like Strapi's qs
+    tree: Dict[str, Any] = {}
+    for key, value in query.items():
+        if key != root and not key.startswith(f"{root}["):
+            continue
+        path = re.findall(r"\[([^\]]*)\]", key[len(root) :])
+        if not path:
+            return value
+        node = tree
+        for part in path[:-1]:
+            node = node.setdefault(part, {})
+        node[path[-1]] = value
+    return tree
+
+
+def as_list(value: Any) -> list:
+    if isinstance(value, dict):
+        return [value[k] for k in sorted(value, key=int)]
+    return [value]
+
+
+def coerce(query_value: str, value: Any) -> Any:
+    if isinstance(value, bool):
+        return query_value == "true"
+    if isinstance(value, (int, float)):
+        try:
+            return type(value)(query_value)
+        except ValueError:
+            return query_value
+    return query_value
+
+
+def apply_operator(op: str, value: Any, arg: Any) -> bool:
+    if op == "$null":
+        return (value is None) == (arg == "true")
+    if op == "$notNull":
+        return (value is not None) == (arg == "true")
+    if op in ("$in", "$notIn"):
+        found = any(value == coerce(a, value) for a in as_list(arg))
+        return found if op == "$in" else not found
+    if op == "$between":
+        low, high = [coerce(a, value) for a in as_list(arg)]
+        return value is not None and low <= value <= high
+    if value is None:
+        return op == "$ne"
+    arg = coerce(arg, value)
+    text, arg_text = str(value), str(arg)
+    return {
+        "$eq": lambda: value == arg,
+        "$eqi": lambda: text.lower() == arg_text.lower(),
+        "$ne": lambda: value != arg,
+        "$lt": lambda: value < arg,
+        "$lte": lambda: value <= arg,
+        "$gt": lambda: value > arg,
+        "$gte": lambda: value >= arg,
+        "$contains": lambda: arg_text in text,
+        "$notContains": lambda: arg_text not in text,
+        "$containsi": lambda: arg_text.lower() in text.lower(),
+        "$notContainsi": lambda: arg_text.lower() not in text.lower(),
+        "$startsWith": lambda: text.startswith(arg_text),
+        "$endsWith": lambda: text.endswith(arg_text),
+    }[op]()
+
+
+class FakeStrapi:
+    def __init__(
+        self,
+        models: Iterable[Type] = (),
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        max_page_size: int = 100,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.max_page_size = max_page_size
+        # collection name -> {attribute: related collection}
+        self.schema: Dict[str, Dict[str, str]] = {UPLOAD: {}}
+        self.rows: Dict[str, Dict[int, dict]] = {UPLOAD: {}}
+        self.next_id: Dict[str, int] = {UPLOAD: 1}
+        self.requests = 0
+        self.uploaded_bytes = 0
+        for model in models:
+            self.register(model)
+
+    @staticmethod
+    def collection_of(model: Type) -> str:
+        if not issubclass(model, StrapiObject):
+            return UPLOAD
+        uri = getattr(model, "_uri", None)
+        return uri.rsplit("/", 1)[-1] if uri else model.__name__.lower()
+
+    def register(self, model: Type):
+        name = self.collection_of(model)
+        if name in self.schema:
+            return
+        rels = relations(model)
+        self.schema[name] = {k: self.collection_of(v) for k, v in rels.items()}
+        self.rows.setdefault(name, {})
+        self.next_id.setdefault(name, 1)
+        for target in rels.values():
+            self.register(target)
+
+    # storage
+
+    def _relation_ids(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self._relation_ids(v) for v in value]
+        if isinstance(value, dict):
+            return value.get("id")
+        return value
+
+    def insert(self, collection: str, attributes: dict) -> dict:
+        id = self.next_id[collection]
+        self.next_id[collection] += 1
+        row = {"createdAt": now(), "updatedAt": now()}
+        if collection != UPLOAD:
+            row["publishedAt"] = now()
+        row.update(self._normalize(collection, attributes))
+        row["id"] = id
+        self.rows[collection][id] = row
+        return row
+
+    def _normalize(self, collection: str, attributes: dict) -> dict:
+        rels = self.schema[collection]
+        return {
+            k: self._relation_ids(v) if k in rels else v
+            for k, v in attributes.items()
+        }
+
+    def add_file(self, name: str, content: bytes, mime: str) -> dict:
+        digest = hashlib.md5(content).hexdigest()[:10]
+        base, ext = os.path.splitext(name)
+        file_hash = f"{re.sub(r'[^A-Za-z0-9]', '_', base)}_{digest}"
+        return self.insert(
+            UPLOAD,
+            {
+                "name": name,
+                "hash": file_hash,
+                "ext": ext,
+                "mime": mime,
+                "size": round(len(content) / 1000, 2),
+                "url": f"/uploads/{file_hash}{ext}",
+                "provider": "local",
+                "alternativeText": None,
+                "caption": None,
+                "width": None,
+                "height": None,
+                "formats": None,
+                "previewUrl": None,
+                "provider_metadata": None,
+            },
+        )
+
+    # querying
+
+    def resolve(self, collection: str, row: dict, attribute: str) -> Any:
+        target = self.schema[collection].get(attribute)
+        value = row.get(attribute)
+        if target is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [self.rows[target].get(i) for i in value]
+        return self.rows[target].get(value)
+
+    def matches(self, collection: str, row: Optional[dict], tree: dict) -> bool:
+        for key, sub in tree.items():
+            if key == "$and":
+                if not all(self.matches(collection, row, s) for s in as_list(sub)):
+                    return False
+            elif key == "$or":
+                if not any(self.matches(collection, row, s) for s in as_list(sub)):
+                    return False
+            elif key == "$not":
+                if self.matches(collection, row, sub):
+                    return False
+            elif key.startswith("$"):
+                value = row.get("id") if row is not None else None
+                if not apply_operator(key, value, sub):
+                    return False
+            elif not self._matches_attribute(collection, row, key, sub):
+                return False
+        return True
+
+    def _matches_attribute(self, collection, row, key, sub) -> bool:
+        target = self.schema[collection].get(key)
+        value = self.resolve(collection, row, key) if row is not None else None
+        if target is None:
+            return all(apply_operator(op, value, arg) for op, arg in sub.items())
+        related = value if isinstance(value, list) else [value]
+        if not related:
+            related = [None]
+        return any(self.matches(target, r, sub) for r in related)
+
+    def render(
+        self, collection: str, row: dict, populate: Any, fields: Any, depth: int = 0
+    ) -> dict:
+        rels = self.schema[collection]
+        wanted = set(as_list(fields)) if fields else None
+        attributes = {
+            k: v
+            for k, v in row.items()
+            if k != "id" and k not in rels and (wanted is None or k in wanted)
+        }
+        if populate == "deep":
+            populate = {k: "deep" for k in rels} if depth < DEEP_DEPTH else {}
+        elif populate in ("*", "true"):
+            populate = {k: "true" for k in rels}
+        for name, sub in (populate or {}).items():
+            if name not in rels:
+                continue
+            sub_populate, sub_fields = sub, None
+            if isinstance(sub, dict):
+                sub_populate, sub_fields = sub.get("populate"), sub.get("fields")
+            elif sub == "true":
+                sub_populate = None
+            value = self.resolve(collection, row, name)
+            if isinstance(value, list):
+                data = [
+                    self.render(rels[name], r, sub_populate, sub_fields, depth + 1)
+                    for r in value
+                    if r is not None
+                ]
+            elif value is None:
+                data = None
+            else:
+                data = self.render(
+                    rels[name], value, sub_populate, sub_fields, depth + 1
+                )
+            attributes[name] = {"data": data}
+        return {"id": row["id"], "attributes": attributes}
+
+    # http
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            return web.json_response(
+                {"error": {"status": 500, "message": "injected error"}}, status=500
+            )
+        return await handler(request)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware], client_max_size=1024**4)
+        app.router.add_post("/api/upload", self.upload)
+        app.router.add_post("/api/upload/register", self.register_file)
+        app.router.add_get("/api/upload/files", self.list_files)
+        app.router.add_get("/api/upload/files/{id}", self.get_file)
+        app.router.add_get("/api/{collection}", self.list)
+        app.router.add_post("/api/{collection}", self.create)
+        app.router.add_get("/api/{collection}/{id}", self.retrieve)
+        app.router.add_put("/api/{collection}/{id}", self.update)
+        app.router.add_delete("/api/{collection}/{id}", self.delete)
+        return app
+
+    def _collection(self, request: web.Request) -> str:
+        collection = request.match_info["collection"]
+        if collection not in self.rows:
+            raise web.HTTPNotFound()
+        return collection
+
+    def _row(self, request: web.Request) -> Tuple[str, dict]:
+        collection = self._collection(request)
+        row = self.rows[collection].get(int(request.match_info["id"]))
+        if row is None:
+            raise web.HTTPNotFound()
+        return collection, row
+
+    async def list(self, request: web.Request) -> web.Response:
+        collection = self._collection(request)
+        query = request.query
+        tree = parse_nested(query, "filters") or {}
+        rows = [
+            r for r in self.rows[collection].values() if self.matches(collection, r, tree)
+        ]
+        sorts = parse_nested(query, "sort")
+        for sort in reversed(as_list(sorts) if sorts else []):
+            name, _, direction = sort.partition(":")
+            rows.sort(key=lambda r: r.get(name), reverse=direction == "desc")
+        pagination = parse_nested(query, "pagination") or {}
+        if pagination.get("limit") == "-1":
+            page, page_size = 1, max(len(rows), 1)
+        else:
+            page = int(pagination.get("page", 1))
+            page_size = min(int(pagination.get("pageSize", 25)), self.max_page_size)
+        page_rows = rows[(page - 1) * page_size : page * page_size]
+        populate = parse_nested(query, "populate")
+        fields = parse_nested(query, "fields")
+        return web.json_response(
+            {
+                "data": [
+                    self.render(collection, r, populate, fields) for r in page_rows
+                ],
+                "meta": {
+                    "pagination": {
+                        "page": page,
+                        "pageSize": page_size,
+                        "pageCount": max(-(-len(rows) // page_size), 1),
+                        "total": len(rows),
+                    }
+                },
+            }
+        )
+
+    async def retrieve(self, request: web.Request) -> web.Response:
+        collection, row = self._row(request)
+        populate = parse_nested(request.query, "populate")
+        fields = parse_nested(request.query, "fields")
+        return web.json_response(
+            {"data": self.render(collection, row, populate, fields), "meta": {}}
+        )
+
+    async def create(self, request: web.Request) -> web.Response:
+        collection = self._collection(request)
+        data = (await request.json()).get("data", {})
+        row = self.insert(collection, data)
+        return web.json_response(
+            {"data": self.render(collection, row, None, None), "meta": {}}
+        )
+
+    async def update(self, request: web.Request) -> web.Response:
+        collection, row = self._row(request)
+        data = (await request.json()).get("data", {})
+        row.update(self._normalize(collection, data))
+        row["updatedAt"] = now()
+        return web.json_response(
+            {"data": self.render(collection, row, None, None), "meta": {}}
+        )
+
+    async def delete(self, request: web.Request) -> web.Response:
+        collection, row = self._row(request)
+        del self.rows[collection][row["id"]]
+        return web.json_response(
+            {"data": self.render(collection, row, None, None), "meta": {}}
+        )
+
+    async def upload(self, request: web.Request) -> web.Response:
+        reader = await request.multipart()
+        files = []
+        async for part in reader:
+            if part.name != "files":
+                continue
+            content = await part.read()
+            self.uploaded_bytes += len(content)
+            files.append(
+                dict(
+                    self.add_file(
+                        part.filename or "blob",
+                        content,
+                        part.headers.get("Content-Type", "application/octet-stream"),
+                    )
+                )
+            )
+        if not files:
+            return web.json_response(
+                {"error": {"status": 400, "message": "Files are empty"}}, status=400
+            )
+        return web.json_response(files)
+
+    async def register_file(self, request: web.Request) -> web.Response:
+        data = (await request.json()).get("data", {})
+        defaults = {
+            k: None
+            for k in (
+                "alternativeText",
+                "caption",
+                "width",
+                "height",
+                "formats",
+                "previewUrl",
+                "provider_metadata",
+            )
+        }
+        return web.json_response(dict(self.insert(UPLOAD, {**defaults, **data})))
+
+    async def list_files(self, request: web.Request) -> web.Response:
+        tree = parse_nested(request.query, "filters") or {}
+        return web.json_response(
+            [
+                dict(r)
+                for r in self.rows[UPLOAD].values()
+                if self.matches(UPLOAD, r, tree)
+            ]
+        )
+
+    async def get_file(self, request: web.Request) -> web.Response:
+        row = self.rows[UPLOAD].get(int(request.match_info["id"]))
+        if row is None:
+            raise web.HTTPNotFound()
+        return web.json_response(dict(row))
+
+
+def default_models() -> List[Type]:
+    import strapi_models as M
+
+    return [
+        M.Author,
+        M.CoachingReplay,
+        M.Course,
+        M.CourseCategory,
+        M.CourseSubcategory,
+        M.FamousPeople,
+        M.PostCourseVideo,
+        M.PostYoutubeVideo,
+    ]
+
+
+if __name__ == "__main__":
+    web.run_app(
+        FakeStrapi(default_models()).app(),
+        port=int(os.getenv("FAKE_STRAPI_PORT", "1337")),
+    )
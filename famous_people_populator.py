@@ -10,6 +10,7 @@ import aiohttp
 import requests
 
 import strapi_models as M
+from strapi_client import get_client
 
 types = [
     "ESTJ",
@@ -92,17 +93,18 @@ def type_to_typeorder(typecode: str) -> int:
     return typecode_order
 
 
-async def process_person(person, existing_names, existing_people, executor, semaphore):
+async def process_person(person, existing_people, executor, semaphore):
     if person.name is None:
         return
     async with semaphore:
-        if person.name not in existing_names:
-            print(f"Creating {person.name}")
-            await person.post()
-        else:
-            existing_person = [x for x in existing_people if x.name == person.name][0]
+        existing_person = existing_people.get(person.name)
+        if existing_person is not None:
+            person.id = existing_person.id
             person.picture = existing_person.picture
             print(f"Checking {person.name}")
+        if person.id is None:
+            print(f"{person.name} was not created, skipping")
+            return
         if person.picture is None:
             print(f"{person.name} has no picture. Fetching...")
             picture_url = person.picture_url
@@ -189,9 +191,19 @@ async def populateFromClover():
 
 
 async def populateMissingImages():
-    existing_people = await M.FamousPeople.all()
+    existing_people = {x.name: x for x in await M.FamousPeople.all()}
     with open("./famous.json") as f:
-        famous_people = json.load(f)
+        famous_people = [M.FamousPeople.from_json(person) for person in json.load(f)]
+
+    new_people = [
+        person
+        for person in famous_people
+        if person.name is not None and person.name not in existing_people
+    ]
+    print(f"Creating {len(new_people)} people")
+    async for result in M.FamousPeople.bulk_create(new_people, concurrency=20):
+        if not result.ok:
+            print(f"Could not create {result.obj.name}: {result.error}")
 
     semaphore = asyncio.Semaphore(50)
     executor = ThreadPoolExecutor(max_workers=50)
@@ -199,8 +211,7 @@ async def populateMissingImages():
     for person in famous_people:
         tasks.append(
             process_person(
-                M.FamousPeople.from_json(person),
-                [x.name for x in existing_people],
+                person,
                 existing_people,
                 executor,
                 semaphore,
@@ -210,7 +221,8 @@ async def populateMissingImages():
 
 
 async def main():
-    await populateMissingImages()
+    async with get_client():
+        await populateMissingImages()
 
 
 if __name__ == "__main__":
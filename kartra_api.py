@@ -1,17 +1,24 @@
+import asyncio
+import atexit
 import json
 import os
-from typing import Optional
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
 
 import aiohttp
 from aiolimiter import AsyncLimiter
-from bs4 import BeautifulSoup, Tag
 from pydantic import BaseModel
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 
-KARTRA_URL = "https://csjoseph.kartra.com/portal"
+from browser_pool import KARTRA_URL, BrowserPool, create_driver, render
+from kartra_parser import (
+    INDEX_MARKER,
+    POST_MARKER,
+    SUBCATEGORY_MARKER,
+    get_parser,
+)
+from page_cache import get_page_cache
+from portal_fetcher import PortalFetcher
 
 
 class KartraClient:
@@ -54,68 +61,56 @@ class KartraClient:
         return response["account_tags"]
 
 
-print("creating driver")
 cookies = json.loads(os.getenv("REQUEST_COOKIES", "{}"))
-options = Options()
-options.add_argument("--headless")
-options.add_argument("--no-sandbox")
-options.add_argument("--disable-dev-shm-usage")
-options.add_argument("--disable-extensions")
-driver = webdriver.Chrome(
-    options=options,
-    service=Service(ChromeDriverManager().install()),
-)
-print("created")
-options.add_argument("--headless=new")
 
+# the one browser fetch_html renders with, started the first time a page
+# needs it rather than at import, so API-only and http-only runs never
+# launch chrome
+_driver = None
+_driver_lock = threading.Lock()
 
-def fetch_html(url: str):
-    print(f"getting {url}")
-    driver.get(url)
-    for name, value in cookies.items():
-        driver.add_cookie({"name": name, "value": value})
-    driver.get(url)
-    is_404 = driver.execute_script(
-        "return document.title.includes('404')"
-        " || document.body.innerText.includes('404 Not Found');"
-    )
-    if is_404:
-        return None
-    return driver.page_source
 
+def get_driver():
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            _driver = create_driver(cookies)
+            atexit.register(close_driver)
+        return _driver
 
-class SoupMonad:
-    def __init__(self, value: Tag):
-        self.value = value
 
-    def find(self, *args, **kwargs):
-        if isinstance(self.value, Tag):
-            self.value = self.value.find(*args, **kwargs)
-        return self
+def close_driver():
+    global _driver
+    with _driver_lock:
+        driver, _driver = _driver, None
+    if driver is not None:
+        driver.quit()
 
-    def find_all(self, *args, **kwargs):
-        if isinstance(self.value, Tag):
-            self.value = self.value.find_all(*args, **kwargs)
-        return self
 
-    def contents(self):
-        if isinstance(self.value, Tag):
-            self.value = self.value.contents
-        return self
+@contextmanager
+def browser() -> Iterator[None]:
+    # with browser(): ... quits the driver on the way out, if anything in the
+    # block started one
+    try:
+        yield
+    finally:
+        close_driver()
 
-    def get(self, *args, **kwargs):
-        if isinstance(self.value, Tag):
-            self.value = self.value.get(*args, **kwargs)
-        return self
 
-    def get_text(self, *args, **kwargs):
-        if isinstance(self.value, Tag):
-            self.value = self.value.get_text(*args, **kwargs).strip()
-        return self
+def render_html(url: str):
+    return render(get_driver(), url)
+
 
-    def unwrap(self):
-        assert self.value is not None
-        return self.value
+def fetch_html(url: str):
+    # render_html behind the page cache; a browser can't revalidate, so a
+    # stale page is simply rendered again
+    cache = get_page_cache()
+    page = cache.lookup(url)
+    if page is not None:
+        return page.html
+    html = render_html(url)
+    cache.store(url, html)
+    return html
 
 
 class KartraCourse(BaseModel):
@@ -160,15 +155,19 @@ class KartraPost(BaseModel):
         self._fetched = True
         html = fetch_html(self.url)
         assert html is not None
-        soup = BeautifulSoup(html, "html.parser")
-        body = SoupMonad(soup).find(class_="panel panel-kartra").unwrap()
-        assert isinstance(body, Tag)
-        vimeo_id = (
-            SoupMonad(body)
-            .find("div", {"data-video_source": "vimeo"})
-            .get("data-video_source_id")
-            .value
-        )
+        return self.parse(html)
+
+    async def fetch_async(self, fetcher: PortalFetcher):
+        if hasattr(self, "_fetched"):
+            return self
+        html = await fetcher.fetch(self.url, POST_MARKER)
+        assert html is not None
+        self.parse(html)
+        self._fetched = True
+        return self
+
+    def parse(self, html: str):
+        vimeo_id = get_parser().post(html)
         if vimeo_id is None:
             return self
         assert isinstance(vimeo_id, str)
@@ -176,74 +175,65 @@ class KartraPost(BaseModel):
         return self
 
 
-def parse_category(soup, course: KartraCourse):
-    name = SoupMonad(soup).find("a").get_text().unwrap()
+def parse_category(name: str, items: list, course: KartraCourse):
     assert isinstance(name, str)
     category = KartraCategory(name=name, course=course)
-    subcategories = SoupMonad(soup).find("ul").contents().unwrap()
-    return sum(
-        [
-            parse_subcategory(subcategory, category, course)
-            for subcategory in subcategories
-            if isinstance(subcategory, Tag)
-        ],
-        [],
-    )
+    return [parse_menu_item(*item, category, course) for item in items]
 
 
-def parse_subcategory(soup, category: KartraCategory, course: KartraCourse):
-    name = SoupMonad(soup).find(class_="dropdown_title").get_text().unwrap()
-    url = SoupMonad(soup).find("a").get("href").unwrap()
+def parse_menu_item(
+    name: str, url: str, category: KartraCategory, course: KartraCourse
+):
+    # a category's menu links either to a subcategory page or straight to a
+    # post, which then sits in a subcategory named after the category
     assert isinstance(url, str)
     assert isinstance(name, str)
     id = int(url.split("/")[-1])
     if "post" in url:
-        return [
-            KartraPost(
-                id=id,
-                name=name,
+        return KartraPost(
+            id=id,
+            name=name,
+            course=course,
+            category=category,
+            subcategory=KartraSubcategory(
+                id=-1,
+                name=category.name,
                 course=course,
                 category=category,
-                subcategory=KartraSubcategory(
-                    id=-1,
-                    name=category.name,
-                    course=course,
-                    category=category,
-                ),
-            )
-        ]
-    subcategory = KartraSubcategory(
+            ),
+        )
+    return KartraSubcategory(
         id=id,
         name=name,
         course=course,
         category=category,
     )
-    html = fetch_html(subcategory.url)
-    assert html is not None
-    soup = BeautifulSoup(html, "html.parser")
-    posts = (
-        SoupMonad(soup)
-        .find(class_="panel panel-blank menu_box")
-        .find(class_="panel-body")
-        .find("ul")
-        .find_all(class_="js_menu_item_navigation_element")
-        .unwrap()
+
+
+def parse_index(html: str, course: KartraCourse):
+    return sum(
+        [
+            parse_category(name, items, course)
+            for name, items in get_parser().index(html)
+        ],
+        [],
     )
+
+
+def parse_subcategory_page(html: str, subcategory: KartraSubcategory):
     return [
-        parse_post(post, subcategory, category, course)
-        for post in posts
-        if isinstance(post, Tag)
+        parse_post(id, name, subcategory, subcategory.category, subcategory.course)
+        for id, name in get_parser().subcategory(html)
     ]
 
 
 def parse_post(
-    soup,
+    id: str,
+    name: str,
     subcategory: KartraSubcategory,
     category: KartraCategory,
     course: KartraCourse,
 ):
-    id = SoupMonad(soup).get("data-item_id").unwrap()
-    name = SoupMonad(soup).find("span").get_text().unwrap()
     assert isinstance(id, str)
     assert isinstance(name, str)
     id = int(id)
@@ -260,18 +250,81 @@ def fetch_all_posts(course_id):
     course = KartraCourse(id=course_id)
     html = fetch_html(course.url + "/index")
     assert html is not None
-    soup = BeautifulSoup(html, "html.parser")
-    categories = (
-        SoupMonad(soup)
-        .find(class_="nav list-unstyled")
-        .find_all(class_="dropdown")
-        .unwrap()
+    posts = []
+    for item in parse_index(html, course):
+        if isinstance(item, KartraPost):
+            posts.append(item)
+            continue
+        html = fetch_html(item.url)
+        assert html is not None
+        posts.extend(parse_subcategory_page(html, item))
+    return posts
+
+
+async def fetch_all_posts_async(course_id, fetcher: PortalFetcher):
+    # same result as fetch_all_posts, with the subcategory pages fetched
+    # concurrently
+    course = KartraCourse(id=course_id)
+    html = await fetcher.fetch(course.url + "/index", INDEX_MARKER)
+    assert html is not None
+    items = parse_index(html, course)
+    pages = await asyncio.gather(
+        *(
+            fetcher.fetch(item.url, SUBCATEGORY_MARKER)
+            for item in items
+            if isinstance(item, KartraSubcategory)
+        )
     )
-    return sum(
-        [
-            parse_category(category, course)
-            for category in categories
-            if isinstance(category, Tag)
-        ],
-        [],
+    pages = iter(pages)
+    posts = []
+    for item in items:
+        if isinstance(item, KartraPost):
+            posts.append(item)
+            continue
+        html = next(pages)
+        assert html is not None
+        posts.extend(parse_subcategory_page(html, item))
+    return posts
+
+
+async def resolve_vimeo_ids(
+    posts: List[KartraPost],
+    fetcher: Optional[PortalFetcher] = None,
+    concurrency: int = 8,
+) -> List[KartraPost]:
+    # fetches up to concurrency post pages at a time and fills in vimeo_id;
+    # returns the posts whose page has no vimeo video. A post whose page
+    # couldn't be fetched is left unfetched so a later fetch_async retries it
+    if fetcher is None:
+        async with portal_fetcher() as fetcher:
+            return await resolve_vimeo_ids(posts, fetcher, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(post: KartraPost):
+        async with semaphore:
+            return await post.fetch_async(fetcher)
+
+    results = await asyncio.gather(
+        *(resolve(post) for post in posts), return_exceptions=True
     )
+    missing = []
+    failed = 0
+    for post, result in zip(posts, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"could not resolve {post.id} {post.name}: {result!r}")
+        elif post.vimeo_id is None:
+            missing.append(post)
+    print(
+        f"resolved {len(posts) - len(missing) - failed} of {len(posts)} vimeo ids,"
+        f" {len(missing)} posts without a vimeo video, {failed} failed"
+    )
+    return missing
+
+
+def portal_fetcher(pool: Optional[BrowserPool] = None, **kwargs) -> PortalFetcher:
+    # pages that need a browser go to the pool when there is one, otherwise
+    # one at a time through the module's driver
+    fallback = pool.fetch if pool is not None else render_html
+    kwargs.setdefault("cache", get_page_cache())
+    return PortalFetcher(cookies=cookies, fallback=fallback, **kwargs)
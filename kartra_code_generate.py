@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 import pyperclip
 import strapi_models as M
 from crypto import encrypt
+from strapi_client import get_client
 
 # Load environment variables
 load_dotenv()
@@ -26,18 +27,19 @@ def escape_curly_braces(html_content):
     return escaped_content
 
 async def main():
-    while True:
-        id_input = input("Enter a Strapi video id: ")
-        try:
-            video_id = int(id_input)
-            result = await run(video_id)
-            pyperclip.copy(result)
-            print("Success!")
-            print("Result copied to clipboard.")
-        except ValueError:
-            print("Invalid input. Please enter a valid integer.")
-        except AssertionError as e:
-            print(e)
+    async with get_client():
+        while True:
+            id_input = input("Enter a Strapi video id: ")
+            try:
+                video_id = int(id_input)
+                result = await run(video_id)
+                pyperclip.copy(result)
+                print("Success!")
+                print("Result copied to clipboard.")
+            except ValueError:
+                print("Invalid input. Please enter a valid integer.")
+            except AssertionError as e:
+                print(e)
 
 if __name__ == "__main__":
     asyncio.run(main())
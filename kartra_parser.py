@@ -0,0 +1,303 @@
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+# classes the parsers look for; a page fetched over http without its marker
+# needs a browser
+INDEX_MARKER = "nav list-unstyled"
+SUBCATEGORY_MARKER = "panel panel-blank menu_box"
+POST_MARKER = "panel panel-kartra"
+
+# (category name, [(menu item name, href)])
+Index = List[Tuple[str, List[Tuple[str, str]]]]
+# [(data-item_id, name)]
+Subcategory = List[Tuple[str, str]]
+
+
+class SoupMonad:
+    def __init__(self, value: Tag):
+        self.value = value
+
+    def find(self, *args, **kwargs):
+        if isinstance(self.value, Tag):
+            self.value = self.value.find(*args, **kwargs)
+        return self
+
+    def find_all(self, *args, **kwargs):
+        if isinstance(self.value, Tag):
+            self.value = self.value.find_all(*args, **kwargs)
+        return self
+
+    def contents(self):
+        if isinstance(self.value, Tag):
+            self.value = self.value.contents
+        return self
+
+    def get(self, *args, **kwargs):
+        if isinstance(self.value, Tag):
+            self.value = self.value.get(*args, **kwargs)
+        return self
+
+    def get_text(self, *args, **kwargs):
+        if isinstance(self.value, Tag):
+            self.value = self.value.get_text(*args, **kwargs).strip()
+        return self
+
+    def unwrap(self):
+        assert self.value is not None
+        return self.value
+
+
+# Every backend pulls the same plain values out of the three kinds of portal
+# page and, like SoupMonad.unwrap, fails an assert when a page doesn't have
+# the expected structure. Markers match the way BeautifulSoup's class_ does:
+# the element's whole class list, in order; single classes match any token
+
+
+class SoupParser:
+    # BeautifulSoup, either over the whole page (the original behaviour) or
+    # with a SoupStrainer so only the marker's subtree is ever built
+    def __init__(self, features: str = "html.parser", strain: bool = True):
+        self.features = features
+        self.strain = strain
+
+    def soup(self, html: str, marker: str) -> BeautifulSoup:
+        parse_only = None
+        if self.strain:
+            # the strainer sees the class attribute as written, before it is
+            # split into a list
+            parse_only = SoupStrainer(
+                class_=lambda value: value is not None
+                and " ".join(value.split()) == marker
+            )
+        return BeautifulSoup(html, self.features, parse_only=parse_only)
+
+    def index(self, html: str) -> Index:
+        soup = self.soup(html, INDEX_MARKER)
+        categories = (
+            SoupMonad(soup)
+            .find(class_=INDEX_MARKER)
+            .find_all(class_="dropdown")
+            .unwrap()
+        )
+        result = []
+        for category in categories:
+            if not isinstance(category, Tag):
+                continue
+            name = SoupMonad(category).find("a").get_text().unwrap()
+            items = []
+            for item in SoupMonad(category).find("ul").contents().unwrap():
+                if not isinstance(item, Tag):
+                    continue
+                title = SoupMonad(item).find(class_="dropdown_title").get_text()
+                href = SoupMonad(item).find("a").get("href")
+                items.append((title.unwrap(), href.unwrap()))
+            result.append((name, items))
+        return result
+
+    def subcategory(self, html: str) -> Subcategory:
+        soup = self.soup(html, SUBCATEGORY_MARKER)
+        posts = (
+            SoupMonad(soup)
+            .find(class_=SUBCATEGORY_MARKER)
+            .find(class_="panel-body")
+            .find("ul")
+            .find_all(class_="js_menu_item_navigation_element")
+            .unwrap()
+        )
+        return [
+            (
+                SoupMonad(post).get("data-item_id").unwrap(),
+                SoupMonad(post).find("span").get_text().unwrap(),
+            )
+            for post in posts
+            if isinstance(post, Tag)
+        ]
+
+    def post(self, html: str) -> Optional[str]:
+        soup = self.soup(html, POST_MARKER)
+        body = SoupMonad(soup).find(class_=POST_MARKER).unwrap()
+        assert isinstance(body, Tag)
+        return (
+            SoupMonad(body)
+            .find("div", {"data-video_source": "vimeo"})
+            .get("data-video_source_id")
+            .value
+        )
+
+
+def has_class(name: str) -> str:
+    # xpath for bs4's class_=name: the whole normalized class list for
+    # several classes, any single token for one
+    if " " in name:
+        return f'normalize-space(@class)="{name}"'
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+class LxmlParser:
+    # libxml2's HTML parser and xpath; the whole page is parsed, but in C
+    def __init__(self):
+        import lxml.html
+
+        self.fromstring = lxml.html.fromstring
+
+    @staticmethod
+    def first(element, path: str):
+        found = element.xpath(path) if element is not None else []
+        return found[0] if found else None
+
+    @staticmethod
+    def text(element) -> str:
+        assert element is not None
+        return element.text_content().strip()
+
+    def index(self, html: str) -> Index:
+        nav = self.first(self.fromstring(html), f".//*[{has_class(INDEX_MARKER)}]")
+        assert nav is not None
+        result = []
+        for category in nav.xpath(f".//*[{has_class('dropdown')}]"):
+            name = self.text(self.first(category, ".//a"))
+            menu = self.first(category, ".//ul")
+            assert menu is not None
+            items = []
+            for item in menu.xpath("./*"):
+                title = self.first(item, f".//*[{has_class('dropdown_title')}]")
+                href = self.first(item, ".//a/@href")
+                assert href is not None
+                items.append((self.text(title), str(href)))
+            result.append((name, items))
+        return result
+
+    def subcategory(self, html: str) -> Subcategory:
+        panel = self.first(
+            self.fromstring(html), f".//*[{has_class(SUBCATEGORY_MARKER)}]"
+        )
+        body = self.first(panel, f".//*[{has_class('panel-body')}]")
+        menu = self.first(body, ".//ul")
+        assert menu is not None
+        result = []
+        for post in menu.xpath(f".//*[{has_class('js_menu_item_navigation_element')}]"):
+            item_id = post.get("data-item_id")
+            assert item_id is not None
+            result.append((item_id, self.text(self.first(post, ".//span"))))
+        return result
+
+    def post(self, html: str) -> Optional[str]:
+        body = self.first(self.fromstring(html), f".//*[{has_class(POST_MARKER)}]")
+        assert body is not None
+        video = self.first(body, './/div[@data-video_source="vimeo"]')
+        return video.get("data-video_source_id") if video is not None else None
+
+
+class SelectolaxParser:
+    # lexbor through selectolax, with css selectors; the fastest backend
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self.parser = LexborHTMLParser
+
+    @staticmethod
+    def below(node, selector: str) -> list:
+        # node.css matches node itself too, find_all doesn't
+        if node is None:
+            return []
+        return [found for found in node.css(selector) if found.mem_id != node.mem_id]
+
+    def first(self, node, selector: str):
+        found = self.below(node, selector)
+        return found[0] if found else None
+
+    def find(self, node, marker: str):
+        # css can't say "exactly these classes", so pick the candidates with
+        # all of them and compare the list
+        for candidate in self.below(node, "." + ".".join(marker.split())):
+            classes = (candidate.attributes.get("class") or "").split()
+            if " ".join(classes) == marker:
+                return candidate
+        return None
+
+    @staticmethod
+    def text(node) -> str:
+        assert node is not None
+        return node.text(deep=True).strip()
+
+    def index(self, html: str) -> Index:
+        nav = self.find(self.parser(html).root, INDEX_MARKER)
+        assert nav is not None
+        result = []
+        for category in self.below(nav, ".dropdown"):
+            name = self.text(self.first(category, "a"))
+            menu = self.first(category, "ul")
+            assert menu is not None
+            items = []
+            for item in menu.iter(include_text=False):
+                if item.tag.startswith("-"):
+                    # -comment
+                    continue
+                link = self.first(item, "a")
+                href = link.attributes.get("href") if link is not None else None
+                assert href is not None
+                title = self.first(item, ".dropdown_title")
+                items.append((self.text(title), href))
+            result.append((name, items))
+        return result
+
+    def subcategory(self, html: str) -> Subcategory:
+        panel = self.find(self.parser(html).root, SUBCATEGORY_MARKER)
+        menu = self.first(self.first(panel, ".panel-body"), "ul")
+        assert menu is not None
+        result = []
+        for post in self.below(menu, ".js_menu_item_navigation_element"):
+            item_id = post.attributes.get("data-item_id")
+            assert item_id is not None
+            result.append((item_id, self.text(self.first(post, "span"))))
+        return result
+
+    def post(self, html: str) -> Optional[str]:
+        body = self.find(self.parser(html).root, POST_MARKER)
+        assert body is not None
+        video = self.first(body, 'div[data-video_source="vimeo"]')
+        if video is None:
+            return None
+        return video.attributes.get("data-video_source_id")
+
+
+PARSERS: Dict[str, Callable] = {
+    "selectolax": SelectolaxParser,
+    "lxml": LxmlParser,
+    "strainer": SoupParser,
+    "html.parser": lambda: SoupParser(strain=False),
+}
+
+
+def available_parsers() -> List[str]:
+    names = []
+    for name, parser in PARSERS.items():
+        try:
+            parser()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+_default_parser = None
+
+
+def get_parser():
+    # KARTRA_PARSER names one of PARSERS; by default the first one whose
+    # library is installed
+    global _default_parser
+    if _default_parser is None:
+        name = os.getenv("KARTRA_PARSER")
+        if name:
+            _default_parser = PARSERS[name]()
+        else:
+            _default_parser = PARSERS[available_parsers()[0]]()
+    return _default_parser
+
+
+def set_parser(parser):
+    global _default_parser
+    _default_parser = PARSERS[parser]() if isinstance(parser, str) else parser
@@ -14,6 +14,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 
 import strapi_models as M
 from crypto import encrypt
+from strapi_client import get_client
 
 path_to_chromedriver = "./chromedriver"
 chrome_options = Options()
@@ -129,8 +130,9 @@ async def monitor_changes():
 
 
 async def main():
-    await asyncio.gather(go_to_journeyman(), get_videos())
-    await monitor_changes()
+    async with get_client():
+        await asyncio.gather(go_to_journeyman(), get_videos())
+        await monitor_changes()
 
 
 if __name__ == "__main__":
@@ -1,54 +1,244 @@
+import argparse
 import asyncio
 import os
-import shutil
+from dataclasses import dataclass, field
+from functools import partial
+from typing import List, Optional
 
 import strapi_models as M
-from kartra_api import KartraPost, fetch_all_posts
-from vimeo_download import download_video
-
-
-async def kartra_to_strapi(post_info: KartraPost):
-    print(post_info.id, post_info.name, "starting post")
-    video_path = f"./videos/{post_info.id}.mp4"
-    audio_path = f"./videos/{post_info.id}.mp3"
-    thumbnail_path = f"./videos/{post_info.id}.jpg"
-    folder_path = os.path.dirname(video_path)
-    if os.path.exists(folder_path):
-        shutil.rmtree(folder_path)
-    course, _ = await M.Course.get_or_create(title=post_info.course.id)
-    category, _ = await M.CourseCategory.get_or_create(
-        name=post_info.category.name,
-        course=course,
-    )
-    subcategory, _ = await M.CourseSubcategory.get_or_create(
-        name=post_info.subcategory.name,
-        course_category=category,
+from browser_pool import BrowserPool
+from kartra_api import (
+    KartraPost,
+    cookies,
+    fetch_all_posts_async,
+    portal_fetcher,
+    resolve_vimeo_ids,
+)
+from migration_journal import FINISHED, MigrationJournal, print_progress
+from migration_plan import StrapiTree, create_parents, diff
+from page_cache import get_page_cache
+from pipeline import Pipeline, Stage
+from portal_fetcher import PortalFetcher
+from scratch import ScratchDir, get_scratch
+from strapi_client import get_client
+from strapi_session import identity_map
+from vimeo_download import download_video, extract_audio, get_video_size
+
+
+@dataclass
+class Job:
+    post: KartraPost
+    journal: MigrationJournal = field(repr=False)
+    subcategory: Optional[M.CourseSubcategory] = None
+    video_id: Optional[str] = None
+    media: Optional[list] = None
+    scratch: Optional[ScratchDir] = None
+
+    @property
+    def video_path(self) -> str:
+        return self.scratch.file(f"{self.post.id}.mp4")
+
+    @property
+    def audio_path(self) -> str:
+        return self.scratch.file(f"{self.post.id}.mp3")
+
+    @property
+    def thumbnail_path(self) -> str:
+        return self.scratch.file(f"{self.post.id}.jpg")
+
+    def log(self, message: str):
+        print(self.post.id, self.post.name, message)
+
+    def entry(self) -> dict:
+        return self.journal.get(self.post.id)
+
+    def reached(self, state: str) -> bool:
+        return self.journal.reached(self.post.id, state)
+
+    def advance(self, state: str, **values):
+        self.journal.advance(self.post.id, state, **values)
+
+    def fail(self, stage: str, error: str):
+        self.log(f"{stage} failed: {error}")
+        self.journal.fail(self.post.id, stage, error)
+
+    def __str__(self) -> str:
+        return f"{self.post.id} {self.post.name}"
+
+
+async def scrape(
+    journal: MigrationJournal,
+    fetcher: PortalFetcher,
+    course_id: str,
+    rescrape: bool = False,
+) -> List[KartraPost]:
+    # a rescrape reads the course again (through the page cache and its TTL)
+    # to pick up posts added since; record_scrape keeps existing progress
+    if journal.is_scraped(course_id) and not rescrape:
+        return [KartraPost.model_validate(p) for p in journal.posts(course_id)]
+    print(f"scraping course {course_id}")
+    posts = await fetch_all_posts_async(course_id, fetcher)
+    journal.record_scrape(course_id, [post.model_dump() for post in posts])
+    return posts
+
+
+async def resolve(fetcher: PortalFetcher, job: Job) -> Optional[Job]:
+    if job.reached("resolved"):
+        job.video_id = job.entry()["video_id"]
+        return job
+    # normally already fetched by plan_jobs; this retries the ones that failed
+    job.video_id = (await job.post.fetch_async(fetcher)).vimeo_id
+    if job.video_id is None:
+        job.log("no kartra video found")
+        job.advance("skipped")
+        return None
+    job.advance("resolved", video_id=job.video_id)
+    return job
+
+
+async def download(job: Job) -> Optional[Job]:
+    # the files don't outlive a run, so anything short of uploaded starts over
+    if job.reached("uploaded"):
+        return job
+    # waits here while the scratch budget is used up by jobs further along
+    job.scratch = await get_scratch().acquire(f"post-{job.post.id}")
+    job.log("starting download")
+    downloaded = await asyncio.to_thread(
+        download_video, job.video_id, job.video_path, audio=False
     )
-    post = await M.PostCourseVideo.get(
-        title=post_info.name,
-        course_subcategory=subcategory,
+    if not downloaded:
+        job.fail("download", "download failed")
+        return None
+    job.advance("downloaded")
+    return job
+
+
+def derive(job: Job) -> Optional[Job]:
+    if job.reached("uploaded"):
+        return job
+    if not extract_audio(job.video_path, job.audio_path):
+        job.fail("derive", "audio extraction failed")
+        return None
+    return job
+
+
+async def upload(job: Job) -> Job:
+    if job.reached("uploaded"):
+        job.media = job.entry()["media"]
+        return job
+    media = await M.Media.upload_many(
+        [job.video_path, job.audio_path, job.thumbnail_path]
     )
-    if post is not None:
-        print(post_info.id, post_info.name, "already exists?")
-        return
-    video_id = post_info.fetch().vimeo_id
-    if video_id is None:
-        print(post_info.id, post_info.name, "no kartra video found")
-        return
-    if not download_video(video_id, video_path):
-        print(post_info.id, post_info.name, "download failed!!")
-        return
-    await M.PostCourseVideo(
-        title=post_info.name,
-        video_file=await M.Media.upload_file(video_path),
-        audio_file=await M.Media.upload_file(audio_path),
-        thumbnail=await M.Media.upload_file(thumbnail_path),
-        course_subcategory=subcategory,
+    # the post only needs ids, which is also all a resumed run has
+    job.media = [m.id if m is not None else None for m in media]
+    job.advance("uploaded", media=job.media)
+    return job
+
+
+async def post(job: Job) -> Job:
+    video_file, audio_file, thumbnail = job.media
+    created = await M.PostCourseVideo(
+        title=job.post.name,
+        video_file=video_file,
+        audio_file=audio_file,
+        thumbnail=thumbnail,
+        course_subcategory=job.subcategory,
     ).post()
-    print(post_info.id, post_info.name, "sucess")
+    job.advance("posted", strapi_id=created.id)
+    job.log("sucess")
+    return job
+
+
+def cleanup(job):
+    if isinstance(job, Job) and job.scratch is not None:
+        get_scratch().release(job.scratch)
+
+
+def record_error(stage: str, job, error: Exception):
+    if isinstance(job, Job):
+        job.journal.fail(job.post.id, stage, repr(error))
+
+
+def migration_pipeline(journal: MigrationJournal, fetcher: PortalFetcher) -> Pipeline:
+    # resolve only fetches the post pages plan_jobs couldn't, still several
+    # at a time within the fetcher's rate limit; disk use is bounded by the
+    # scratch budget as well as the queues
+    return Pipeline(
+        [
+            Stage("resolve", partial(resolve, fetcher), workers=4),
+            Stage("download", download, workers=int(os.getenv("DOWNLOADS", 3))),
+            Stage("derive", derive, workers=2, blocking=True),
+            Stage("upload", upload, workers=2),
+            Stage("post", post, workers=4),
+        ],
+        finalize=cleanup,
+        on_error=record_error,
+    )
+
+
+async def plan_jobs(
+    journal: MigrationJournal,
+    fetcher: PortalFetcher,
+    posts: List[KartraPost],
+    dry_run: bool,
+) -> List[Job]:
+    # one bulk read of strapi instead of a lookup per post
+    tree = await StrapiTree.load()
+    plan = diff(tree, posts)
+    # every new post's vimeo id in one concurrent pass, so the size estimate
+    # covers them all and the resolve stage has nothing left to wait on
+    await resolve_vimeo_ids(
+        [p for p in plan.posts if not journal.reached(p.id, "resolved")],
+        fetcher,
+        concurrency=int(os.getenv("RESOLVE_CONCURRENCY", 8)),
+    )
+    video_ids = {
+        post.id: post.vimeo_id or journal.get(post.id)["video_id"]
+        for post in plan.posts
+    }
+    await asyncio.to_thread(plan.estimate_bytes, video_ids, get_video_size)
+    print(plan.summary())
+    if dry_run:
+        return []
+    for post_id, strapi_id in plan.existing.items():
+        if journal.get(post_id)["state"] not in FINISHED:
+            journal.advance(post_id, "skipped", strapi_id=strapi_id)
+    subcategory_ids = await create_parents(plan, tree)
+    jobs = []
+    for kartra_post in plan.posts:
+        subcategory_id = subcategory_ids[kartra_post.subcategory.name]
+        job = Job(
+            kartra_post,
+            journal,
+            subcategory=M.CourseSubcategory(id=subcategory_id),
+        )
+        if job.entry()["state"] in FINISHED:
+            continue
+        if not job.reached("checked"):
+            job.advance("checked", subcategory_id=subcategory_id)
+        jobs.append(job)
+    print(f"{len(jobs)} posts to migrate")
+    return jobs
 
 
 async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the migration plan and stop"
+    )
+    parser.add_argument(
+        "--rescrape",
+        action="store_true",
+        help="scrape kartra again for courses already in the journal",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="read kartra pages only from the page cache",
+    )
+    args = parser.parse_args()
+    if args.offline:
+        get_page_cache().offline = True
     print("starting")
     course_ids = [
         "joS402GfMsrK",  # EBT
@@ -58,10 +248,21 @@ async def main():
         "rmEnfb8YRlrK",  # UMF
         "BC7bO1RDMuZa",  # Acolyte
     ]
-    for course_id in course_ids:
-        print(f"starting course {course_id}")
-        for post in fetch_all_posts(course_id):
-            await kartra_to_strapi(post)
+    journal = MigrationJournal()
+    browsers = BrowserPool(cookies, size=int(os.getenv("BROWSERS", 2)))
+    async with get_client(), browsers, portal_fetcher(browsers) as fetcher:
+        posts = []
+        for course_id in course_ids:
+            posts.extend(await scrape(journal, fetcher, course_id, args.rescrape))
+        with identity_map() as imap:
+            jobs = await plan_jobs(journal, fetcher, posts, args.dry_run)
+            if jobs:
+                await migration_pipeline(journal, fetcher).run(jobs)
+            print(f"identity map: {imap.hits} hits, {imap.misses} misses")
+        print(get_client().stats)
+        print(fetcher)
+        browsers.report()
+    print_progress(journal)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_PATH = os.getenv("MIGRATION_JOURNAL_PATH", "./migration_journal.sqlite3")
+
+# in the order a post moves through them; "skipped" means there was nothing
+# to migrate (already in strapi, or no video on the kartra page)
+STATES = ("scraped", "checked", "resolved", "downloaded", "uploaded", "posted")
+FINISHED = ("posted", "skipped")
+
+
+class MigrationJournal:
+    # one row per kartra post recording the last stage it finished and the
+    # strapi ids found along the way, so a restart can pick up where it left
+    # off without scraping kartra or querying strapi again
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        # stages that run in threads write to it too
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS courses (
+                course_id TEXT PRIMARY KEY,
+                scraped_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS posts (
+                post_id INTEGER PRIMARY KEY,
+                course_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                post TEXT NOT NULL,
+                state TEXT NOT NULL,
+                subcategory_id INTEGER,
+                video_id TEXT,
+                media TEXT,
+                strapi_id INTEGER,
+                failed_stage TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+        self.db.commit()
+
+    def is_scraped(self, course_id: str) -> bool:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT 1 FROM courses WHERE course_id = ?", (course_id,)
+            ).fetchone()
+        return row is not None
+
+    def record_scrape(self, course_id: str, posts: List[dict]):
+        # post dicts are whatever the scraper needs to rebuild the post later
+        now = time.time()
+        with self.lock, self.db:
+            for post in posts:
+                self.db.execute(
+                    "INSERT INTO posts (post_id, course_id, name, post, state,"
+                    " updated_at) VALUES (?, ?, ?, ?, 'scraped', ?)"
+                    " ON CONFLICT (post_id) DO UPDATE SET post = excluded.post",
+                    (post["id"], course_id, post["name"], json.dumps(post), now),
+                )
+            self.db.execute(
+                "INSERT OR REPLACE INTO courses VALUES (?, ?)", (course_id, now)
+            )
+
+    def posts(self, course_id: str) -> List[dict]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT post FROM posts WHERE course_id = ? ORDER BY rowid",
+                (course_id,),
+            ).fetchall()
+        return [json.loads(row["post"]) for row in rows]
+
+    def get(self, post_id: int) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT * FROM posts WHERE post_id = ?", (post_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["media"] = json.loads(entry["media"]) if entry["media"] else None
+        return entry
+
+    def reached(self, post_id: int, state: str) -> bool:
+        entry = self.get(post_id)
+        if entry is None:
+            return False
+        if entry["state"] in FINISHED:
+            return True
+        return STATES.index(entry["state"]) >= STATES.index(state)
+
+    def advance(self, post_id: int, state: str, **values):
+        # values are any of subcategory_id, video_id, media, strapi_id
+        if "media" in values:
+            values["media"] = json.dumps(values["media"])
+        columns = "".join(f", {key} = ?" for key in values)
+        with self.lock, self.db:
+            self.db.execute(
+                f"UPDATE posts SET state = ?, failed_stage = NULL, error = NULL,"
+                f" updated_at = ?{columns} WHERE post_id = ?",
+                (state, time.time(), *values.values(), post_id),
+            )
+
+    def fail(self, post_id: int, stage: str, error: str):
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE posts SET failed_stage = ?, error = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE post_id = ?",
+                (stage, error, time.time(), post_id),
+            )
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT course_id, state, failed_stage IS NOT NULL AS failed,"
+                " COUNT(*) AS n FROM posts GROUP BY course_id, state, failed"
+            ).fetchall()
+        for row in rows:
+            state = f"failed after {row['state']}" if row["failed"] else row["state"]
+            counts.setdefault(row["course_id"], {})[state] = row["n"]
+        return counts
+
+    def failures(self) -> List[dict]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT post_id, name, state, failed_stage, error, attempts"
+                " FROM posts WHERE failed_stage IS NOT NULL ORDER BY course_id, rowid"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+def print_progress(journal: MigrationJournal):
+    for course_id, counts in journal.summary().items():
+        total = sum(counts.values())
+        done = sum(counts.get(state, 0) for state in FINISHED)
+        print(f"{course_id}: {done}/{total} finished")
+        for state, n in sorted(counts.items()):
+            print(f"    {state}: {n}")
+    for failure in journal.failures():
+        print(
+            f"{failure['post_id']} {failure['name']}: {failure['failed_stage']}"
+            f" failed {failure['attempts']}x after {failure['state']}:"
+            f" {failure['error']}"
+        )
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH
+    print_progress(MigrationJournal(path))
@@ -0,0 +1,130 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+import strapi_models as M
+
+
+@dataclass
+class StrapiTree:
+    # keyed by name the same way the get_or_create lookups in main.py always
+    # matched: courses by title, categories and subcategories by name, posts
+    # by subcategory and title
+    courses: Dict[str, int] = field(default_factory=dict)
+    categories: Dict[str, int] = field(default_factory=dict)
+    subcategories: Dict[str, int] = field(default_factory=dict)
+    posts: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+    @classmethod
+    async def load(cls) -> "StrapiTree":
+        courses, categories, subcategories, posts = await asyncio.gather(
+            M.Course.all(fields=["title"]),
+            M.CourseCategory.all(fields=["name"]),
+            M.CourseSubcategory.all(fields=["name"]),
+            M.PostCourseVideo.all(
+                fields=["title"], populate={"course_subcategory": ["name"]}
+            ),
+        )
+        tree = cls()
+        for course in courses:
+            tree.courses.setdefault(course.title, course.id)
+        for category in categories:
+            tree.categories.setdefault(category.name, category.id)
+        for subcategory in subcategories:
+            tree.subcategories.setdefault(subcategory.name, subcategory.id)
+        for post in posts:
+            if post.course_subcategory is not None:
+                key = (post.course_subcategory.name, post.title)
+                tree.posts.setdefault(key, post.id)
+        return tree
+
+
+@dataclass
+class MigrationPlan:
+    courses: List[str] = field(default_factory=list)
+    # (course title, category name)
+    categories: List[Tuple[str, str]] = field(default_factory=list)
+    # (category name, subcategory name)
+    subcategories: List[Tuple[str, str]] = field(default_factory=list)
+    posts: list = field(default_factory=list)
+    existing: Dict[int, int] = field(default_factory=dict)
+    estimated_bytes: Optional[int] = None
+    estimated_from: int = 0
+
+    def summary(self) -> str:
+        lines = [
+            f"create {len(self.courses)} courses, {len(self.categories)} categories,"
+            f" {len(self.subcategories)} subcategories, {len(self.posts)} posts"
+            f" ({len(self.existing)} posts already in strapi)"
+        ]
+        for title in self.courses:
+            lines.append(f"  + course {title}")
+        for course, name in self.categories:
+            lines.append(f"  + category {name} in {course}")
+        for category, name in self.subcategories:
+            lines.append(f"  + subcategory {name} in {category}")
+        for post in self.posts:
+            lines.append(f"  + post {post.id} {post.name} in {post.subcategory.name}")
+        if self.estimated_bytes is None:
+            lines.append("transfer size unknown")
+        else:
+            lines.append(
+                f"about {self.estimated_bytes / 1e9:.1f} GB to download and upload"
+                f" (from {self.estimated_from} sampled videos)"
+            )
+        return "\n".join(lines)
+
+    def estimate_bytes(self, video_ids: Dict[int, str], video_size, sample: int = 20):
+        # video_size is a blocking vimeo lookup, so only a sample of the posts
+        # with a known vimeo id are sized and the average is scaled up
+        known = [video_ids[post.id] for post in self.posts if video_ids.get(post.id)]
+        sizes = [
+            size
+            for size in map(video_size, random.sample(known, min(sample, len(known))))
+            if size
+        ]
+        self.estimated_from = len(sizes)
+        if sizes:
+            self.estimated_bytes = sum(sizes) * len(self.posts) // len(sizes)
+
+
+def diff(tree: StrapiTree, kartra_posts: list) -> MigrationPlan:
+    plan = MigrationPlan()
+    courses: Set[str] = set(tree.courses)
+    categories: Set[str] = set(tree.categories)
+    subcategories: Set[str] = set(tree.subcategories)
+    for post in kartra_posts:
+        course, category = post.course.id, post.category.name
+        subcategory = post.subcategory.name
+        existing = tree.posts.get((subcategory, post.name))
+        if existing is not None:
+            plan.existing[post.id] = existing
+            continue
+        if course not in courses:
+            courses.add(course)
+            plan.courses.append(course)
+        if category not in categories:
+            categories.add(category)
+            plan.categories.append((course, category))
+        if subcategory not in subcategories:
+            subcategories.add(subcategory)
+            plan.subcategories.append((category, subcategory))
+        plan.posts.append(post)
+    return plan
+
+
+async def create_parents(plan: MigrationPlan, tree: StrapiTree) -> Dict[str, int]:
+    # a handful of rows, created in order so each can point at its parent;
+    # returns subcategory ids by name for the posts
+    for title in plan.courses:
+        tree.courses[title] = (await M.Course(title=title).post()).id
+    for course, name in plan.categories:
+        category = M.CourseCategory(name=name, course=tree.courses[course])
+        tree.categories[name] = (await category.post()).id
+    for category, name in plan.subcategories:
+        subcategory = M.CourseSubcategory(
+            name=name, course_category=tree.categories[category]
+        )
+        tree.subcategories[name] = (await subcategory.post()).id
+    return tree.subcategories
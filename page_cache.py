@@ -0,0 +1,178 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+DEFAULT_PATH = os.getenv("PAGE_CACHE_PATH", "./page_cache.sqlite3")
+DEFAULT_TTL = float(os.getenv("PAGE_CACHE_TTL_HOURS", 24)) * 3600
+DEFAULT_OFFLINE = os.getenv("PAGE_CACHE_OFFLINE", "") not in ("", "0")
+
+
+class PageNotCached(LookupError):
+    pass
+
+
+@dataclass
+class CachedPage:
+    url: str
+    # None for a page that was missing when it was fetched
+    html: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class PageCache:
+    # portal pages by url, zlib-compressed, with the validators the server
+    # sent. Pages younger than ttl seconds are used as they are; older ones
+    # are revalidated with If-None-Match/If-Modified-Since where the server
+    # gave an ETag or Last-Modified. Offline, every cached page counts as
+    # fresh and anything else raises PageNotCached
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        ttl: float = DEFAULT_TTL,
+        offline: bool = DEFAULT_OFFLINE,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        # the blocking browser fallback writes from a thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                html BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.db.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.stored = 0
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT html, etag, last_modified, fetched_at FROM pages"
+                " WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        html, etag, last_modified, fetched_at = row
+        if html is not None:
+            html = zlib.decompress(html).decode()
+        return CachedPage(url, html, etag, last_modified, fetched_at)
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return self.offline or page.age() < self.ttl
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        # the page if it can be used without asking the server; None if it
+        # has to be fetched or revalidated
+        page = self.get(url)
+        if page is not None and self.is_fresh(page):
+            self.hits += 1
+            return page
+        if self.offline:
+            raise PageNotCached(url)
+        return None
+
+    def store(
+        self,
+        url: str,
+        html: Optional[str],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        blob = zlib.compress(html.encode()) if html is not None else None
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (url, blob, etag, last_modified, time.time()),
+            )
+        self.stored += 1
+
+    def store_rendered(self, url: str, html: Optional[str]):
+        # a browser rendering of a page whose http response is already
+        # stored: the validators still describe that response, so a later 304
+        # means the rendering is current too
+        blob = zlib.compress(html.encode()) if html is not None else None
+        with self.lock, self.db:
+            updated = self.db.execute(
+                "UPDATE pages SET html = ?, fetched_at = ? WHERE url = ?",
+                (blob, time.time(), url),
+            ).rowcount
+        if updated:
+            self.stored += 1
+        else:
+            self.store(url, html)
+
+    def touch(self, url: str):
+        # the server said 304
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url)
+            )
+        self.revalidated += 1
+
+    @staticmethod
+    def conditional_headers(page: Optional[CachedPage]) -> Dict[str, str]:
+        headers = {}
+        if page is not None and page.etag:
+            headers["If-None-Match"] = page.etag
+        if page is not None and page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM pages")
+
+    def __str__(self) -> str:
+        with self.lock:
+            count, size = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(html)), 0) FROM pages"
+            ).fetchone()
+        return (
+            f"page cache: {count} pages, {size / 1e6:.1f} MB compressed,"
+            f" {self.hits} hits, {self.revalidated} revalidated, {self.stored} stored"
+        )
+
+    def close(self):
+        self.db.close()
+
+
+_default_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PageCache()
+    return _default_cache
+
+
+def set_page_cache(cache: Optional[PageCache]):
+    global _default_cache
+    _default_cache = cache
+
+
+if __name__ == "__main__":
+    cache = PageCache()
+    if "--clear" in sys.argv[1:]:
+        cache.clear()
+    print(cache)
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+# put on a queue once per downstream worker when its upstream is finished
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    dropped: int = 0
+    failed: int = 0
+    busy: float = 0.0
+    started: Optional[float] = None
+
+    @property
+    def per_second(self) -> float:
+        if self.started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+    def __str__(self) -> str:
+        average = self.busy / max(self.processed + self.failed, 1)
+        return (
+            f"{self.name:>10}: {self.processed} done, {self.dropped} dropped,"
+            f" {self.failed} failed, {self.per_second * 3600:.0f}/h,"
+            f" {average:.1f}s each x{self.workers}"
+        )
+
+
+@dataclass
+class Stage:
+    # fn takes an item and returns the item for the next stage, or None to
+    # drop it. fan_out stages return an iterable of items instead. blocking
+    # functions run in a thread; stages sharing a lock never overlap (e.g.
+    # everything that drives the one selenium browser)
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 2
+    blocking: bool = False
+    fan_out: bool = False
+    lock: Optional[asyncio.Lock] = None
+    stats: StageStats = field(init=False)
+
+    def __post_init__(self):
+        self.stats = StageStats(self.name, self.workers)
+
+    async def call(self, item):
+        async with AsyncExitStack() as stack:
+            if self.lock is not None:
+                await stack.enter_async_context(self.lock)
+            if self.blocking:
+                return await asyncio.to_thread(self.fn, item)
+            return await self.fn(item)
+
+
+class Pipeline:
+    # stages are connected by bounded queues, so a slow stage backs up the
+    # ones before it instead of piling up work (and video files) in between
+    def __init__(
+        self,
+        stages: List[Stage],
+        finalize: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[str, Any, Exception], None]] = None,
+        report_every: float = 60,
+    ):
+        self.stages = stages
+        self.finalize = finalize
+        self.on_error = on_error
+        self.report_every = report_every
+
+    def report(self):
+        for stage in self.stages:
+            print(stage.stats)
+
+    def _leave(self, item):
+        if self.finalize is not None:
+            self.finalize(item)
+
+    async def _worker(self, stage: Stage, inbox: asyncio.Queue, outbox):
+        stats = stage.stats
+        while (item := await inbox.get()) is not _DONE:
+            if stats.started is None:
+                stats.started = time.monotonic()
+            start = time.monotonic()
+            try:
+                result = await stage.call(item)
+            except Exception as e:
+                stats.failed += 1
+                print(f"{stage.name} failed on {item}: {e!r}")
+                if self.on_error is not None:
+                    self.on_error(stage.name, item, e)
+                self._leave(item)
+                continue
+            finally:
+                stats.busy += time.monotonic() - start
+            if result is None:
+                stats.dropped += 1
+                self._leave(item)
+                continue
+            stats.processed += 1
+            for out in result if stage.fan_out else (result,):
+                if outbox is None:
+                    self._leave(out)
+                else:
+                    await outbox.put(out)
+
+    async def _run_stage(self, stage: Stage, inbox, outbox, downstream: int):
+        await asyncio.gather(
+            *(self._worker(stage, inbox, outbox) for _ in range(stage.workers))
+        )
+        if outbox is not None:
+            for _ in range(downstream):
+                await outbox.put(_DONE)
+
+    async def _feed(self, items: Iterable, queue: asyncio.Queue, workers: int):
+        for item in items:
+            await queue.put(item)
+        for _ in range(workers):
+            await queue.put(_DONE)
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self.report_every)
+            self.report()
+
+    async def run(self, items: Iterable) -> List[StageStats]:
+        queues = [asyncio.Queue(stage.queue_size) for stage in self.stages]
+        tasks = [self._feed(items, queues[0], self.stages[0].workers)]
+        for i, stage in enumerate(self.stages):
+            last = i == len(self.stages) - 1
+            tasks.append(
+                self._run_stage(
+                    stage,
+                    queues[i],
+                    None if last else queues[i + 1],
+                    0 if last else self.stages[i + 1].workers,
+                )
+            )
+        reporter = asyncio.create_task(self._report_periodically())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+        self.report()
+        return [stage.stats for stage in self.stages]
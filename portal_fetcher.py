@@ -0,0 +1,133 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+from typing import Callable, Dict, Optional
+
+import aiohttp
+from aiolimiter import AsyncLimiter
+
+from page_cache import PageCache, PageNotCached
+
+# a page is missing if its title or body says so, the same check the
+# selenium path runs in the browser
+NOT_FOUND_MARKERS = ("<title>404", "404 Not Found")
+
+
+def looks_like_404(html: str) -> bool:
+    head, _, _ = html.partition("</title>")
+    return NOT_FOUND_MARKERS[0] in head or NOT_FOUND_MARKERS[1] in html
+
+
+class PortalFetcher:
+    # fetches portal pages over plain HTTP with the REQUEST_COOKIES session,
+    # many at a time but no faster than rate_limit per second. When a page
+    # comes back without the marker its parser looks for (it needs JS, or the
+    # session was bounced to a login page) it is rendered with fallback:
+    # either a BrowserPool's fetch or a blocking render_html, which is run
+    # one page at a time. With a cache, fresh pages (and their renderings)
+    # never touch the network and stale ones are revalidated
+    def __init__(
+        self,
+        cookies: Optional[Dict[str, str]] = None,
+        fallback: Optional[Callable[[str], Optional[str]]] = None,
+        concurrency: int = 8,
+        rate_limit: float = 5,
+        timeout: float = 30,
+        cache: Optional[PageCache] = None,
+    ):
+        if cookies is None:
+            cookies = json.loads(os.getenv("REQUEST_COOKIES", "{}"))
+        self.cookies = cookies
+        self.fallback = fallback
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = AsyncLimiter(rate_limit, 1)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.fallback_lock = asyncio.Lock()
+        self.cache = cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.fetched = 0
+        self.fallbacks = 0
+        self.seconds = 0.0
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                cookies=self.cookies, timeout=self.timeout
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> "PortalFetcher":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def get(self, url: str) -> Optional[str]:
+        stale = None
+        if self.cache is not None:
+            page = self.cache.lookup(url)
+            if page is not None:
+                return page.html
+            stale = self.cache.get(url)
+        async with self.semaphore:
+            await self.limiter.acquire()
+            start = time.monotonic()
+            print(f"getting {url}")
+            async with self.session.get(
+                url, headers=PageCache.conditional_headers(stale)
+            ) as response:
+                html = await response.text()
+            self.seconds += time.monotonic() - start
+            self.fetched += 1
+        if response.status == 304 and stale is not None:
+            self.cache.touch(url)
+            return stale.html
+        if response.status == 404 or looks_like_404(html):
+            html = None
+        else:
+            response.raise_for_status()
+        if self.cache is not None:
+            self.cache.store(
+                url,
+                html,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+        return html
+
+    async def fetch(self, url: str, marker: Optional[str] = None) -> Optional[str]:
+        html = await self.get(url)
+        if html is None or marker is None or marker in html:
+            return html
+        if self.cache is not None and self.cache.offline:
+            raise PageNotCached(f"{url} has no {marker!r} in the cached copy")
+        if self.fallback is None:
+            raise ValueError(f"{url} has no {marker!r} and there is no fallback")
+        print(f"{url} needs a browser")
+        self.fallbacks += 1
+        if inspect.iscoroutinefunction(self.fallback):
+            # e.g. BrowserPool.fetch, which does its own queueing
+            html = await self.fallback(url)
+        else:
+            async with self.fallback_lock:
+                html = await asyncio.to_thread(self.fallback, url)
+        if self.cache is not None:
+            self.cache.store_rendered(url, html)
+        return html
+
+    def __str__(self) -> str:
+        rate = self.fetched / self.seconds if self.seconds else 0.0
+        summary = (
+            f"{self.fetched} pages over http ({rate:.1f}/s per connection),"
+            f" {self.fallbacks} rendered in a browser"
+        )
+        if self.cache is not None:
+            summary += f"; {self.cache}"
+        return summary
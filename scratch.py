@@ -0,0 +1,145 @@
+import asyncio
+import atexit
+import os
+import re
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Set
+
+DEFAULT_ROOT = os.getenv("SCRATCH_DIR", "./scratch")
+DEFAULT_BUDGET = int(float(os.getenv("SCRATCH_BUDGET_GB", 20)) * 1024**3)
+# what a job reserves when it can't say; roughly one course video plus its
+# audio and thumbnail
+DEFAULT_JOB_SIZE = int(float(os.getenv("SCRATCH_JOB_GB", 2)) * 1024**3)
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+    return total
+
+
+# bases of the ScratchSpaces in this process, which remove_stale must not
+# mistake for leftovers of an earlier process with the same pid
+_live_bases: Set[str] = set()
+
+
+class ScratchDir:
+    def __init__(self, path: str, reserved: int):
+        self.path = path
+        self.reserved = reserved
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def size(self) -> int:
+        return dir_size(self.path)
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __str__(self) -> str:
+        return self.path
+
+
+class ScratchSpace:
+    # hands out a private directory per job under root/<pid>-<suffix>/ and
+    # keeps the space reserved by live jobs under budget; jobs that would go
+    # over wait for others to finish. Directories go away when the job ends,
+    # when the process exits, or, after a crash, the next time a ScratchSpace
+    # starts
+    def __init__(self, root: str = DEFAULT_ROOT, budget: int = DEFAULT_BUDGET):
+        self.root = root
+        self.budget = budget
+        self.reserved = 0
+        self.jobs = 0
+        self.waiters: List[asyncio.Future] = []
+        self.remove_stale()
+        os.makedirs(root, exist_ok=True)
+        self.base = tempfile.mkdtemp(dir=root, prefix=f"{os.getpid()}-")
+        _live_bases.add(os.path.abspath(self.base))
+        atexit.register(shutil.rmtree, self.base, ignore_errors=True)
+
+    def remove_stale(self):
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            match = re.fullmatch(r"(\d+)(-.*)?", name)
+            if match is None:
+                continue
+            pid = int(match.group(1))
+            path = os.path.join(self.root, name)
+            # a directory with our pid that no ScratchSpace here owns was left
+            # by an earlier process that had it, e.g. main.py as pid 1 in a
+            # container that crashed
+            if pid_alive(pid) and (
+                pid != os.getpid() or os.path.abspath(path) in _live_bases
+            ):
+                continue
+            print(f"removing scratch space left by {pid}")
+            shutil.rmtree(path, ignore_errors=True)
+
+    async def acquire(self, name: str, size: int = DEFAULT_JOB_SIZE) -> ScratchDir:
+        # a job bigger than the whole budget still runs, just on its own
+        while self.reserved and self.reserved + size > self.budget:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            await waiter
+        self.reserved += size
+        self.jobs += 1
+        path = tempfile.mkdtemp(
+            dir=self.base,
+            prefix=f"{self.jobs}-{re.sub(r'[^A-Za-z0-9_.-]', '_', str(name))}-",
+        )
+        return ScratchDir(path, size)
+
+    def release(self, scratch: ScratchDir):
+        shutil.rmtree(scratch.path, ignore_errors=True)
+        if scratch.reserved:
+            self.reserved -= scratch.reserved
+            scratch.reserved = 0
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def job(
+        self, name: str, size: int = DEFAULT_JOB_SIZE
+    ) -> AsyncIterator[ScratchDir]:
+        scratch = await self.acquire(name, size)
+        try:
+            yield scratch
+        finally:
+            self.release(scratch)
+
+
+_default_scratch: Optional[ScratchSpace] = None
+
+
+def get_scratch() -> ScratchSpace:
+    global _default_scratch
+    if _default_scratch is None:
+        _default_scratch = ScratchSpace()
+    return _default_scratch
+
+
+def set_scratch(scratch: Optional[ScratchSpace]):
+    global _default_scratch
+    _default_scratch = scratch
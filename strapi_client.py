@@ -0,0 +1,158 @@
+import asyncio
+import os
+import warnings
+from dataclasses import dataclass
+from typing import Optional, Set
+
+import aiohttp
+
+
+@dataclass
+class ConnectionStats:
+    opened: int = 0
+    reused: int = 0
+    requests: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.opened + self.reused
+        return self.reused / total if total else 0.0
+
+
+class StrapiClient:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 60,
+        ttl_dns_cache: int = 300,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ):
+        self.base_url = base_url or os.getenv("STRAPI_URL")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = timeout or aiohttp.ClientTimeout(total=5 * 60)
+        self.stats = ConnectionStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        async def on_connection_create_end(session, ctx, params):
+            self.stats.opened += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats.reused += 1
+
+        async def on_request_start(session, ctx, params):
+            self.stats.requests += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_request_start.append(on_request_start)
+        return trace_config
+
+    @property
+    def is_open(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self.is_open and self._loop is not loop:
+            connector = self._detach_session()
+            if connector is not None:
+                task = loop.create_task(connector.close())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+        if not self.is_open:
+            # a session is bound to the loop it was created on, so scripts and
+            # tests that call asyncio.run() more than once get a fresh pool
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=self.ttl_dns_cache,
+                ),
+                timeout=self.timeout,
+                trace_configs=[self._trace_config()],
+            )
+            self._loop = loop
+        return self._session
+
+    def _detach_session(self) -> Optional[aiohttp.BaseConnector]:
+        # the session's loop has finished (or isn't this one), so it can't be
+        # awaited: detach it so it isn't reported unclosed, and hand back its
+        # pool for the caller to close
+        assert self._session is not None
+        warnings.warn(
+            "closing a Strapi session left open by another event loop;"
+            " wrap the loop's work in `async with get_client():`",
+            ResourceWarning,
+            stacklevel=3,
+        )
+        connector = self._session.connector
+        self._session.detach()
+        self._session = None
+        self._loop = None
+        return connector
+
+    async def open(self) -> "StrapiClient":
+        self.session
+        return self
+
+    async def close(self):
+        if self.is_open:
+            if self._loop is asyncio.get_running_loop():
+                assert self._session is not None
+                await self._session.close()
+            else:
+                connector = self._detach_session()
+                if connector is not None:
+                    await connector.close()
+        self._session = None
+        self._loop = None
+
+    async def __aenter__(self) -> "StrapiClient":
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def request(self, method: str, path: str, **kwargs):
+        return self.session.request(method, self.url(path), **kwargs)
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path: str, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+
+_default_client: Optional[StrapiClient] = None
+
+
+def get_client() -> StrapiClient:
+    global _default_client
+    if _default_client is None:
+        _default_client = StrapiClient()
+    return _default_client
+
+
+def set_client(client: StrapiClient):
+    global _default_client
+    _default_client = client
@@ -1,13 +1,25 @@
+import asyncio
+import json
 import os
-from dataclasses import dataclass
+import sys
+from contextlib import ExitStack
+from dataclasses import dataclass, fields
 from datetime import datetime
 from typing import Any, ClassVar, Dict, List, Optional
 
 import aiohttp
 
-import strapi_object
+from direct_upload import BucketConfig, direct_upload
 from famous_people_populator import type_to_typeorder
-from strapi_object import StrapiObject
+from strapi_client import get_client
+from strapi_object import SlotsMeta, StrapiObject
+from upload_index import file_digest, get_index
+from upload_stream import (
+    DEFAULT_CHUNK_SIZE,
+    ProgressCallback,
+    stream_upload,
+    throughput,
+)
 
 
 class Datetime(datetime):
@@ -27,8 +39,14 @@ class Datetime(datetime):
         return self.isoformat()
 
 
-@dataclass
-class Media:
+def compact_json(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"))
+
+
+@dataclass(init=False)
+class Media(metaclass=SlotsMeta):
     id: int
     name: str
     hash: str
@@ -43,17 +61,59 @@ class Media:
     caption: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
-    formats: Optional[Dict[str, Any]] = None
     previewUrl: Optional[str] = None
-    provider_metadata: Optional[Dict[str, Any]] = None
+    # formats and provider_metadata are kept as JSON text and parsed on
+    # access; most callers only ever read the url
+    _formats: Optional[str] = None
+    _provider_metadata: Optional[str] = None
+
+    def __init__(self, **data):
+        for key, value in data.items():
+            if key in ("ext", "mime", "provider") and value is not None:
+                value = sys.intern(value)
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                raise TypeError(f"Media got an unexpected field {key!r}") from None
+
+    def __getattr__(self, name: str) -> Any:
+        # partial projections (e.g. just "url") leave the other fields unset
+        if name in self.__dataclass_fields__:
+            return None
+        raise AttributeError(f"'Media' object has no attribute {name!r}")
+
+    @property
+    def formats(self) -> Optional[Dict[str, Any]]:
+        return None if self._formats is None else json.loads(self._formats)
+
+    @formats.setter
+    def formats(self, value: Optional[Dict[str, Any]]):
+        self._formats = compact_json(value)
+
+    @property
+    def provider_metadata(self) -> Optional[Dict[str, Any]]:
+        if self._provider_metadata is None:
+            return None
+        return json.loads(self._provider_metadata)
+
+    @provider_metadata.setter
+    def provider_metadata(self, value: Optional[Dict[str, Any]]):
+        self._provider_metadata = compact_json(value)
 
     def serialize_to_post(self):
-        return self.__dict__
+        data = {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if not f.name.startswith("_")
+        }
+        data["formats"] = self.formats
+        data["provider_metadata"] = self.provider_metadata
+        return data
 
     @classmethod
     def pre_process_field(cls, data: Any) -> Optional["Media"]:
-        if data is None:
-            return None
+        if data is None or isinstance(data, (cls, int)):
+            return data
         if isinstance(data, list):
             return cls.pre_process_field({"data": data[0]})
         if not isinstance(data, dict):
@@ -69,21 +129,155 @@ class Media:
             raise ValueError(f"Invalid media data: {str(e)}")
 
     @classmethod
-    async def upload_file(cls, file_path: str):
+    async def upload_file(
+        cls,
+        file_path: str,
+        dedupe: bool = True,
+        verify: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+        direct: bool = False,
+        bucket: Optional[BucketConfig] = None,
+    ):
         if not os.path.isfile(file_path):
             return None
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(60 * 60)
-        ) as session:
-            with open(file_path, "rb") as f:
-                async with session.post(
-                    url=f"{strapi_object.BASE_URL}/api/upload",
-                    data={"files": f},
-                ) as response:
-                    if response.status != 200:
-                        raise Exception(f"{response.status} - {await response.text()}")
-                    response_data = (await response.json())[0]
-                    return cls(**response_data)
+        client = get_client()
+        if dedupe:
+            size = os.path.getsize(file_path)
+            digest = await asyncio.to_thread(file_digest, file_path)
+            media = await cls._find_uploaded(digest, size, verify)
+            if media is not None:
+                return media
+        if direct:
+            # straight to the bucket, then registered with strapi
+            response_data = await direct_upload(client, file_path, bucket, progress)
+        else:
+            response_data, _ = await stream_upload(
+                client, file_path, chunk_size, progress
+            )
+            response_data = response_data[0]
+        if dedupe:
+            get_index().record(digest, size, client.base_url, response_data)
+        return cls(**response_data)
+
+    @classmethod
+    async def upload_many(
+        cls,
+        file_paths: List[str],
+        small_file_size: int = 8 * 1024 * 1024,
+        batch_size: int = 32 * 1024 * 1024,
+        concurrency: int = 3,
+        dedupe: bool = True,
+    ) -> List[Optional["Media"]]:
+        # small files share one multipart request, large ones go up in
+        # parallel; results come back in input order, None for missing files
+        # and failed uploads
+        results: List[Optional[Media]] = [None] * len(file_paths)
+        semaphore = asyncio.Semaphore(concurrency)
+        batches, batch, batch_bytes, large = [], [], 0, []
+        for i, file_path in enumerate(file_paths):
+            if not os.path.isfile(file_path):
+                continue
+            size = os.path.getsize(file_path)
+            if size > small_file_size:
+                large.append(i)
+                continue
+            if batch and batch_bytes + size > batch_size:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(i)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+
+        async def upload_large(i: int):
+            async with semaphore:
+                results[i] = await cls.upload_file(file_paths[i], dedupe=dedupe)
+
+        async def upload_batch(indexes: List[int]):
+            async with semaphore:
+                uploaded = await cls._upload_batch(
+                    [file_paths[i] for i in indexes], dedupe
+                )
+            for i, media in zip(indexes, uploaded):
+                results[i] = media
+
+        # a failed upload leaves its files at None, like a missing file, and
+        # doesn't abandon the others half way
+        groups = [[i] for i in large] + batches
+        outcomes = await asyncio.gather(
+            *map(upload_large, large),
+            *map(upload_batch, batches),
+            return_exceptions=True,
+        )
+        for indexes, outcome in zip(groups, outcomes):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                names = ", ".join(os.path.basename(file_paths[i]) for i in indexes)
+                print(f"Failed to upload {names}: {outcome}")
+        return results
+
+    @classmethod
+    async def _upload_batch(
+        cls, file_paths: List[str], dedupe: bool
+    ) -> List[Optional["Media"]]:
+        client = get_client()
+        results: List[Optional[Media]] = [None] * len(file_paths)
+        keys = {}
+        for i, file_path in enumerate(file_paths):
+            if not dedupe:
+                continue
+            size = os.path.getsize(file_path)
+            digest = await asyncio.to_thread(file_digest, file_path)
+            results[i] = await cls._find_uploaded(digest, size, verify=False)
+            keys[i] = (digest, size)
+        pending = [i for i, media in enumerate(results) if media is None]
+        if not pending:
+            return results
+        with ExitStack() as stack:
+            form = aiohttp.FormData()
+            for i in pending:
+                form.add_field(
+                    "files",
+                    stack.enter_context(open(file_paths[i], "rb")),
+                    filename=os.path.basename(file_paths[i]),
+                )
+            async with client.post(
+                "/api/upload",
+                data=form,
+                timeout=throughput.timeout(
+                    sum(os.path.getsize(file_paths[i]) for i in pending)
+                ),
+            ) as response:
+                if response.status != 200:
+                    raise Exception(f"{response.status} - {await response.text()}")
+                response_data = await response.json()
+        for i, media_data in zip(pending, response_data):
+            if dedupe:
+                get_index().record(*keys[i], client.base_url, media_data)
+            results[i] = cls(**media_data)
+        return results
+
+    @classmethod
+    async def _find_uploaded(
+        cls, digest: str, size: int, verify: bool
+    ) -> Optional["Media"]:
+        client = get_client()
+        index = get_index()
+        media_data = index.lookup(digest, size, client.base_url)
+        if media_data is None:
+            return None
+        if not verify:
+            return cls(**media_data)
+        # make sure strapi still has it; size is stored in KB
+        async with client.get(f"/api/upload/files/{media_data['id']}") as response:
+            if response.status == 200:
+                current = await response.json()
+                if abs(current["size"] - size / 1000) < 0.01:
+                    return cls(**current)
+        index.forget(digest, size, client.base_url)
+        return None
 
 
 @dataclass(init=False, repr=False)
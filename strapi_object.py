@@ -1,9 +1,26 @@
+import asyncio
 import os
-import urllib
 from dataclasses import dataclass, fields
-from typing import Any, Optional, Type, TypeVar, Union, get_args, get_type_hints
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_type_hints,
+)
 
-import aiohttp
+from strapi_client import StrapiClient, get_client
+from strapi_query import Q, build_plan
+from strapi_session import current_identity_map, in_flight
 
 BASE_URL = os.getenv("STRAPI_URL")
 assert BASE_URL is not None
@@ -54,12 +71,186 @@ def serialize_to_post(obj):
     return obj
 
 
-class StrapiMeta(type):
+SCALAR_TYPES = (str, int, float, bool)
+
+
+def compile_decoder(expected_type: Type) -> Callable[[Any], Any]:
+    if hasattr(expected_type, "pre_process_field"):
+        hook = expected_type.pre_process_field
+        return lambda field: hook(unwrap_dict_with_data(field))
+    if is_optional_type(expected_type):
+        inner = compile_decoder(get_args(expected_type)[0])
+
+        def decode_optional(field):
+            field = unwrap_dict_with_data(field)
+            if field is None:
+                return None
+            return inner(field)
+
+        return decode_optional
+    if get_origin(expected_type) is list:
+        inner = compile_decoder(get_args(expected_type)[0])
+
+        def decode_list(field):
+            field = unwrap_dict_with_data(field)
+            if field is None:
+                return None
+            return [inner(item) for item in field]
+
+        return decode_list
+    return unwrap_dict_with_data
+
+
+def compile_encoder(expected_type: Type) -> Callable[[Any], Any]:
+    if is_optional_type(expected_type):
+        expected_type = get_args(expected_type)[0]
+    if expected_type in SCALAR_TYPES:
+        return lambda v: v if type(v) in SCALAR_TYPES else serialize_to_post(v)
+    return serialize_to_post
+
+
+class FieldCodec:
+    def __init__(self, cls: Type):
+        hints = {
+            k: v
+            for k, v in get_type_hints(cls).items()
+            if get_origin(v) is not ClassVar
+        }
+        self.decoders: Dict[str, Callable[[Any], Any]] = {
+            k: compile_decoder(v) for k, v in hints.items()
+        }
+        self.encoders: Dict[str, Callable[[Any], Any]] = {
+            k: compile_encoder(v) for k, v in hints.items()
+        }
+
+    def encode(self, data: dict) -> dict:
+        encoders = self.encoders
+        return {
+            k: encoders.get(k, serialize_to_post)(v)
+            for k, v in data.items()
+            if k != "id" and not k.startswith("_")
+        }
+
+
+_codecs: Dict[Type, FieldCodec] = {}
+
+
+def codec_for(cls: Type) -> FieldCodec:
+    # compiled on first use rather than at class creation so that forward
+    # references like "Season" resolve once every model is defined
+    codec = _codecs.get(cls)
+    if codec is None:
+        codec = _codecs[cls] = FieldCodec(cls)
+    return codec
+
+
+@dataclass
+class BulkResult:
+    obj: Any
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_bulk(
+    objs: Iterable, action: Callable, concurrency: int, batch_size: int
+) -> AsyncIterator[BulkResult]:
+    # at most batch_size objects are pulled from objs ahead of completion and
+    # at most concurrency requests are in flight; results stream back in
+    # completion order
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(obj) -> BulkResult:
+        async with semaphore:
+            try:
+                await action(obj)
+            except Exception as e:
+                return BulkResult(obj, e)
+            return BulkResult(obj)
+
+    items = iter(objs)
+    pending = set()
+    try:
+        while True:
+            for obj in islice(items, max(batch_size - len(pending), 0)):
+                pending.add(asyncio.create_task(run(obj)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def lookup_value(value: Any) -> Any:
+    # a hashable stand-in for a lookup argument: relations by id, lists of
+    # them as tuples, and anything else unhashable by its repr
+    if hasattr(value, "serialize_to_post"):
+        return getattr(value, "id", value)
+    if isinstance(value, (list, tuple)):
+        return tuple(lookup_value(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+class SlotsMeta(type):
+    # turns each class's annotated fields into __slots__ and moves their
+    # defaults into _defaults, which __getattr__ serves until a slot is set
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        defaults = {}
+        for base in reversed(bases):
+            defaults.update(getattr(base, "_defaults", {}))
+        defaults.update(namespace.pop("_defaults", {}))
+        inherited = {
+            slot
+            for base in bases
+            for klass in base.__mro__
+            for slot in getattr(klass, "__slots__", ())
+        }
+        slots = list(namespace.pop("__slots__", ()))
+        for key, hint in namespace.get("__annotations__", {}).items():
+            if get_origin(hint) is ClassVar:
+                continue
+            if key in namespace:
+                defaults[key] = namespace.pop(key)
+            if key not in inherited:
+                slots.append(key)
+        namespace["__slots__"] = tuple(slots)
+        namespace["_defaults"] = defaults
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+class StrapiMeta(SlotsMeta):
     def __call__(cls, *args, **kwargs):
-        if "attributes" in kwargs:
+        from_api = "attributes" in kwargs
+        if from_api:
             attributes = kwargs.pop("attributes")
             kwargs.update(attributes)
-        return super().__call__(*args, **kwargs)
+        if not from_api:
+            return super().__call__(*args, **kwargs)
+        imap = current_identity_map()
+        obj = imap.get(cls, kwargs.get("id")) if imap is not None else None
+        if obj is not None:
+            # same entity seen earlier in this session: merge in the new data
+            # without clobbering unsaved changes
+            dirty = obj._dirty or ()
+            obj._update({k: v for k, v in kwargs.items() if k not in dirty})
+            return obj
+        obj = super().__call__(*args, **kwargs)
+        # hydrated from a data/attributes envelope, so nothing is unsaved
+        obj.mark_clean()
+        if imap is not None:
+            imap.add(obj)
+        return obj
 
 
 @dataclass(init=False, repr=False)
@@ -68,19 +259,76 @@ class StrapiObject(metaclass=StrapiMeta):
     createdAt: Optional[str] = None
     updatedAt: Optional[str] = None
     publishedAt: Optional[str] = None
+    _client: ClassVar[Optional[StrapiClient]] = None
+    # fields live in slots; __dict__ only materializes for attributes the
+    # model doesn't declare, and _dirty stays None until something changes
+    __slots__ = ("__dict__", "_dirty")
+    _defaults = {"_dirty": None}
 
     def __init__(self, **data):
+        self._update(data)
+        object.__setattr__(self, "_dirty", set(data))
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._defaults[name]
+        except KeyError:
+            pass
+        # fields a sparse projection (fields=[...]) didn't load read as None,
+        # as with Media; is_set tells them apart from a loaded None
+        if name in self.__dataclass_fields__:
+            return None
+        raise AttributeError(
+            f"{self.__class__.__name__!r} object has no attribute {name!r}"
+        )
+
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        if not name.startswith("_"):
+            self.mark_dirty(name)
+
+    def mark_clean(self):
+        object.__setattr__(self, "_dirty", None)
+
+    def mark_dirty(self, *names: str):
+        # for in-place changes setattr can't see, e.g. obj.authors.append(...)
+        if self._dirty is None:
+            object.__setattr__(self, "_dirty", set(names))
+        else:
+            self._dirty.update(names)
+
+    def is_set(self, name: str) -> bool:
+        # whether the field was loaded or assigned, rather than defaulted
+        try:
+            object.__getattribute__(self, name)
+        except AttributeError:
+            return False
+        return True
+
+    def as_dict(self) -> dict:
+        data = {
+            f.name: getattr(self, f.name) for f in fields(self) if self.is_set(f.name)
+        }
+        data.update(self.__dict__)
+        return data
+
+    def changes(self) -> dict:
+        return {k: getattr(self, k) for k in self._dirty or ()}
+
+    def _update(self, data: dict):
+        decoders = codec_for(self.__class__).decoders
         for key, value in data.items():
-            expected_type = get_type_hints(self.__class__).get(key)
-            if expected_type:
-                value = pre_process_field(value, expected_type)
-            setattr(self, key, value)
+            decode = decoders.get(key)
+            if decode is not None:
+                value = decode(value)
+            object.__setattr__(self, key, value)
 
     @classmethod
     def pre_process_field(cls, obj):
-        if obj is None:
-            return None
-        return cls(**{"id": obj.get("id"), **obj.get("attributes", {})})
+        if not isinstance(obj, dict):
+            # None, an already built object, or a bare id such as coach=7
+            return obj
+        return cls(id=obj.get("id"), attributes=obj.get("attributes", {}))
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -89,122 +337,237 @@ class StrapiObject(metaclass=StrapiMeta):
         res = f"{self.__class__.__name__}("
         for field_info in fields(self):
             k = field_info.name
+            if not self.is_set(k):
+                continue
             v = getattr(self, k)
             res += f"\n    {k}={v.__repr__()}"
         res += "\n)"
         return res
 
     @classmethod
-    async def all(cls):
-        url = f"{BASE_URL}{cls._uri}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url=url,
-                timeout=30,
-                params={
-                    "populate": "deep",
-                    "pagination[limit]": "-1",
-                    "publicationState": "preview",
-                },
-            ) as response:
-                if response.status != 200:
-                    raise Exception(
-                        f"{response.status} - {await response.text()}",
+    def client(cls) -> StrapiClient:
+        return cls._client or get_client()
+
+    @classmethod
+    def query_params(cls, fields=None, populate=None, filters=None) -> dict:
+        # without a projection every relation is populated, as deep as
+        # populate=deep went; pass fields/populate to fetch less
+        return {
+            **(filters.to_params() if filters is not None else {}),
+            **build_plan(cls, fields, populate).to_params(),
+            "publicationState": "preview",
+        }
+
+    @classmethod
+    async def fetch_page(
+        cls, page: int, page_size: int, params: Optional[dict] = None
+    ) -> Tuple[list, int]:
+        params = {
+            **(params or cls.query_params()),
+            "pagination[page]": str(page),
+            "pagination[pageSize]": str(page_size),
+        }
+        async with cls.client().get(cls._uri, timeout=30, params=params) as response:
+            if response.status != 200:
+                raise Exception(
+                    f"{response.status} - {await response.text()}",
+                )
+            response_data = await response.json()
+        page_count = response_data.get("meta", {}).get("pagination", {}).get(
+            "pageCount", 1
+        )
+        return [cls(**item) for item in response_data.get("data")], page_count
+
+    @classmethod
+    async def fetch_after(
+        cls,
+        last_id: Optional[int],
+        page_size: int,
+        fields=None,
+        populate=None,
+        filters=None,
+    ) -> Tuple[list, int]:
+        # keyset pagination: the first page_size rows, by id, after last_id
+        if last_id is not None:
+            after = Q(id__gt=last_id)
+            filters = after if filters is None else filters & after
+        params = {
+            **cls.query_params(fields, populate, filters),
+            "sort[0]": "id:asc",
+        }
+        return await cls.fetch_page(1, page_size, params)
+
+    @classmethod
+    async def iter(
+        cls,
+        page_size: int = 100,
+        prefetch: bool = True,
+        fields=None,
+        populate=None,
+        filters=None,
+    ):
+        # Pages are ordered by id and each starts after the last id seen, so
+        # rows that are updated out of the filter, inserted or deleted while
+        # iterating can't make later pages repeat or skip rows. The next page
+        # therefore depends on this one; with prefetch it is requested while
+        # this one is being consumed.
+        query = dict(fields=fields, populate=populate, filters=filters)
+        objs, page_count = await cls.fetch_after(None, page_size, **query)
+        pending = None
+        try:
+            while objs:
+                if page_count > 1 and prefetch:
+                    pending = asyncio.create_task(
+                        cls.fetch_after(objs[-1].id, page_size, **query)
                     )
-                response_data = await response.json()
-                data = response_data.get("data")
-                return [cls(**item) for item in data]
+                for obj in objs:
+                    yield obj
+                if page_count <= 1:
+                    return
+                if pending is None:
+                    objs, page_count = await cls.fetch_after(
+                        objs[-1].id, page_size, **query
+                    )
+                else:
+                    objs, page_count = await pending
+                    pending = None
+        finally:
+            if pending is not None:
+                pending.cancel()
 
     @classmethod
-    async def get(cls, **kwargs):
-        filters = {}
+    async def all(cls, fields=None, populate=None, filters=None):
+        return [
+            obj
+            async for obj in cls.iter(
+                fields=fields, populate=populate, filters=filters
+            )
+        ]
+
+    @classmethod
+    def lookup_params(cls, **kwargs) -> dict:
+        params = {}
         for key, value in kwargs.items():
             if hasattr(value, "serialize_to_filter"):
                 key, value = value.serialize_to_filter()
-                filters[key] = value
+                params[key] = str(value)
                 continue
             if (
                 hasattr(value, "serialize_to_post")
                 and value != value.serialize_to_post()
             ):
                 continue
-            filters[f"filters[{key}][$eq]"] = value
-        query_string = urllib.parse.urlencode(filters)
-        url = f"{BASE_URL}{cls._uri}?{query_string}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                url=url,
-                params={"populate": "deep"},
-            ) as response:
-                if response.status != 200:
-                    print(url)
-                    raise Exception(response.status)
-                response_data = await response.json()
-                data = response_data.get("data")
-                if len(data) == 1:
-                    return cls(**data[0])
-                else:
-                    return None
+            params[f"filters[{key}][$eq]"] = str(value)
+        return params
+
+    @staticmethod
+    def lookup_key(**kwargs) -> tuple:
+        # relations are keyed by id even though get() doesn't filter on them
+        return tuple(sorted((k, lookup_value(v)) for k, v in kwargs.items()))
+
+    @classmethod
+    async def get(cls, *, fields=None, populate=None, filters=None, **kwargs):
+        imap = current_identity_map()
+        if fields is not None or populate is not None or filters is not None:
+            imap = None
+        if imap is not None:
+            obj = imap.get_lookup(cls, cls.lookup_key(**kwargs))
+            if obj is not None:
+                return obj
+        params = {
+            **cls.query_params(fields, populate, filters),
+            **cls.lookup_params(**kwargs),
+        }
+        obj = await in_flight.do(
+            (cls, "get", tuple(sorted(params.items()))),
+            lambda: cls._get(params),
+        )
+        if obj is not None and imap is not None:
+            imap.add_lookup(cls, cls.lookup_key(**kwargs), obj)
+        return obj
+
+    @classmethod
+    async def _get(cls, params: dict):
+        async with cls.client().get(cls._uri, params=params) as response:
+            if response.status != 200:
+                print(cls._uri, params)
+                raise Exception(response.status)
+            response_data = await response.json()
+            data = response_data.get("data")
+            if len(data) != 1:
+                return None
+            return cls(**data[0])
 
     @classmethod
     async def get_or_create(cls, **attributes):
+        return await in_flight.do(
+            (cls, "get_or_create", cls.lookup_key(**attributes)),
+            lambda: cls._get_or_create(**attributes),
+        )
+
+    @classmethod
+    async def _get_or_create(cls, **attributes):
         existing_object = await cls.get(**attributes)
         if existing_object:
             return (existing_object, False)
         new_object = cls(**attributes)
         await new_object.post()
+        imap = current_identity_map()
+        if imap is not None:
+            imap.add_lookup(cls, cls.lookup_key(**attributes), new_object)
         return new_object, True
 
+    @classmethod
+    def bulk_create(
+        cls, objs: Iterable, concurrency: int = 8, batch_size: int = 100
+    ) -> AsyncIterator[BulkResult]:
+        return run_bulk(objs, lambda obj: obj.post(), concurrency, batch_size)
+
+    @classmethod
+    def bulk_update(
+        cls, objs: Iterable, concurrency: int = 8, batch_size: int = 100
+    ) -> AsyncIterator[BulkResult]:
+        return run_bulk(objs, lambda obj: obj.put(), concurrency, batch_size)
+
     async def post(self):
-        data = self.__dict__
-        data.pop("id", None)  # Remove id if it exists
-        data = {k: serialize_to_post(v) for k, v in data.items()}
-        data = {"data": data}
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url=f"{BASE_URL}{self._uri}",
-                json=data,
-            ) as response:
-                assert response.status == 200, await response.text()
-                response_data = await response.json()
-                new_data = response_data.get("data")
-                if new_data:
-                    self.id = new_data["id"]  # Update the id of the object
-                    attributes = new_data.get("attributes", {})
-                    for key, value in attributes.items():
-                        expected_type = get_type_hints(self.__class__).get(key)
-                        if expected_type:
-                            value = pre_process_field(value, expected_type)
-                        setattr(self, key, value)
-                return self
+        data = {"data": codec_for(self.__class__).encode(self.as_dict())}
+        async with self.client().post(self._uri, json=data) as response:
+            assert response.status == 200, await response.text()
+            response_data = await response.json()
+            new_data = response_data.get("data")
+            if new_data:
+                self.id = new_data["id"]  # Update the id of the object
+                self._update(new_data.get("attributes", {}))
+                self.mark_clean()
+                imap = current_identity_map()
+                if imap is not None:
+                    imap.add(self)
+            return self
 
     async def delete(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.delete(
-                url=f"{BASE_URL}{self._uri}/{self.id}",
-            ) as response:
-                assert response.status == 200
+        async with self.client().delete(f"{self._uri}/{self.id}") as response:
+            assert response.status == 200
+        imap = current_identity_map()
+        if imap is not None:
+            imap.discard(self)
 
     async def put(self):
-        data = {k: serialize_to_post(v) for k, v in self.__dict__.items() if k != "id"}
-        data = {"data": data}
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                url=f"{BASE_URL}{self._uri}/{self.id}",
-                json=data,
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to update: {await response.text()}")
-                response_data = await response.json()
-                updated_data = response_data.get("data")
-                if "attributes" in updated_data:
-                    updated_data = updated_data.get("attributes", {})
-                for key, value in updated_data.items():
-                    expected_type = get_type_hints(self.__class__).get(key)
-                    if expected_type:
-                        value = pre_process_field(value, expected_type)
-                    self.__dict__[key] = value
-                return self
+        body = codec_for(self.__class__).encode(self.changes())
+        if not body:
+            # nothing strapi would store, e.g. only id was set
+            self.mark_clean()
+            return self
+        data = {"data": body}
+        async with self.client().put(f"{self._uri}/{self.id}", json=data) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to update: {await response.text()}")
+            response_data = await response.json()
+            updated_data = response_data.get("data")
+            if "attributes" in updated_data:
+                updated_data = updated_data.get("attributes", {})
+            self._update(updated_data)
+            self.mark_clean()
+            return self
 
     def serialize_to_post(self) -> Any:
         return self.id
@@ -0,0 +1,227 @@
+from dataclasses import dataclass, field, is_dataclass
+from functools import lru_cache
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
+# as deep as populate=deep goes by default, so calls without a projection get
+# what they used to, minus the cycles
+DEFAULT_MAX_DEPTH = 5
+
+
+def unwrap_type(type_hint: Any) -> Any:
+    while get_origin(type_hint) in (Union, list):
+        args = [a for a in get_args(type_hint) if a is not type(None)]
+        type_hint = args[0]
+    return type_hint
+
+
+def is_relation_type(type_hint: Any) -> bool:
+    return (
+        isinstance(type_hint, type)
+        and is_dataclass(type_hint)
+        and hasattr(type_hint, "pre_process_field")
+    )
+
+
+@lru_cache(maxsize=None)
+def attribute_types(cls: Type) -> Dict[str, Any]:
+    # by the name strapi uses: a private field behind a property (Media's
+    # _formats, stored as compact json) goes by the property's name, and
+    # other private fields aren't attributes at all
+    types = {}
+    for name, hint in get_type_hints(cls).items():
+        if get_origin(hint) is ClassVar:
+            continue
+        if name.startswith("_"):
+            name = name.lstrip("_")
+            if not isinstance(getattr(cls, name, None), property):
+                continue
+        types[name] = unwrap_type(hint)
+    return types
+
+
+def relations(cls: Type) -> Dict[str, Type]:
+    return {k: v for k, v in attribute_types(cls).items() if is_relation_type(v)}
+
+
+@dataclass
+class QueryPlan:
+    fields: Optional[List[str]] = None
+    populate: Dict[str, "QueryPlan"] = field(default_factory=dict)
+
+    def to_params(self, prefix: str = "") -> Dict[str, str]:
+        params = {}
+        fields_key = f"{prefix}[fields]" if prefix else "fields"
+        populate_key = f"{prefix}[populate]" if prefix else "populate"
+        for i, name in enumerate(self.fields or []):
+            params[f"{fields_key}[{i}]"] = name
+        for name, sub_plan in self.populate.items():
+            key = f"{populate_key}[{name}]"
+            if sub_plan.fields is None and not sub_plan.populate:
+                params[key] = "true"
+            else:
+                params.update(sub_plan.to_params(key))
+        return params
+
+
+def default_plan(cls: Type, max_depth: int = DEFAULT_MAX_DEPTH) -> QueryPlan:
+    return _default_plan(cls, max_depth, frozenset())
+
+
+@lru_cache(maxsize=None)
+def _default_plan(cls: Type, depth: int, seen: frozenset) -> QueryPlan:
+    # follow relations from the type hints, but never back into a model that
+    # is already on the path (Season <-> PostCourseVideo and friends)
+    seen = seen | {cls}
+    plan = QueryPlan()
+    if depth <= 0:
+        return plan
+    for name, target in relations(cls).items():
+        if target in seen:
+            continue
+        plan.populate[name] = _default_plan(target, depth - 1, seen)
+    return plan
+
+
+def check_fields(cls: Type, names: List[str]):
+    known = attribute_types(cls)
+    for name in names:
+        if name not in known:
+            raise ValueError(f"{cls.__name__} has no field {name!r}")
+        if name in relations(cls):
+            raise ValueError(
+                f"{cls.__name__}.{name} is a relation, pass it in populate instead"
+            )
+
+
+def build_plan(
+    cls: Type,
+    fields: Optional[List[str]] = None,
+    populate: Union[None, bool, list, dict] = None,
+    nested: bool = False,
+) -> QueryPlan:
+    # populate=True means "populate this relation", so it only makes sense
+    # nested under one
+    if populate is True and not nested:
+        raise ValueError("populate=True needs a relation, e.g. {'video_file': True}")
+    if fields is None and populate is None:
+        return default_plan(cls)
+    if fields is not None:
+        check_fields(cls, fields)
+    plan = QueryPlan(fields=list(fields) if fields is not None else None)
+    if populate is None or populate is True:
+        return plan
+    if isinstance(populate, list):
+        # ["name", {"course_category": ["name"]}]
+        names = [i for i in populate if isinstance(i, str)]
+        nested = {}
+        for i in populate:
+            if isinstance(i, dict):
+                nested.update(i)
+        if names:
+            check_fields(cls, names)
+        plan.fields = names or plan.fields
+        populate = nested
+    for name, sub_spec in populate.items():
+        target = relations(cls).get(name)
+        if target is None:
+            raise ValueError(f"{cls.__name__} has no relation {name!r}")
+        plan.populate[name] = build_plan(target, None, sub_spec, nested=True)
+    return plan
+
+
+OPERATORS = {
+    "eq",
+    "eqi",
+    "ne",
+    "lt",
+    "lte",
+    "gt",
+    "gte",
+    "in",
+    "notIn",
+    "contains",
+    "notContains",
+    "containsi",
+    "notContainsi",
+    "null",
+    "notNull",
+    "between",
+    "startsWith",
+    "endsWith",
+}
+
+
+def encode_filter_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if hasattr(value, "serialize_to_post"):
+        value = value.serialize_to_post()
+    return str(value)
+
+
+class Q:
+    # Q(video_file__ext__eqi=".mov") | ~Q(audio_file__id__null=True)
+    # the last segment may be a Strapi operator without the "$", default eq
+
+    def __init__(self, **lookups):
+        self.op = "$and"
+        self.children: List[Any] = sorted(lookups.items())
+
+    @classmethod
+    def _combine(cls, op: str, children: list) -> "Q":
+        q = cls()
+        q.op = op
+        q.children = children
+        return q
+
+    def __and__(self, other: "Q") -> "Q":
+        return Q._combine("$and", [self, other])
+
+    def __or__(self, other: "Q") -> "Q":
+        return Q._combine("$or", [self, other])
+
+    def __invert__(self) -> "Q":
+        return Q._combine("$not", [self])
+
+    def to_params(self, prefix: str = "filters") -> Dict[str, str]:
+        params = {}
+        if self.op == "$not":
+            params.update(self.children[0].to_params(f"{prefix}[$not]"))
+            return params
+        if self.op == "$and" and all(isinstance(c, tuple) for c in self.children):
+            # a plain Q(...) needs no $and wrapper as long as keys don't repeat
+            for lookup, value in self.children:
+                params.update(lookup_params(prefix, lookup, value))
+            return params
+        for i, child in enumerate(self.children):
+            child_prefix = f"{prefix}[{self.op}][{i}]"
+            if isinstance(child, tuple):
+                params.update(lookup_params(child_prefix, *child))
+            else:
+                params.update(child.to_params(child_prefix))
+        return params
+
+
+def lookup_params(prefix: str, lookup: str, value: Any) -> Dict[str, str]:
+    *path, op = lookup.split("__")
+    if op not in OPERATORS:
+        path.append(op)
+        op = "eq"
+    if hasattr(value, "serialize_to_post") and hasattr(value, "id"):
+        # relations are matched on their id
+        path.append("id")
+    key = prefix + "".join(f"[{p}]" for p in path) + f"[${op}]"
+    if isinstance(value, (list, tuple, set)):
+        return {f"{key}[{i}]": encode_filter_value(v) for i, v in enumerate(value)}
+    return {key: encode_filter_value(value)}
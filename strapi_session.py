@@ -0,0 +1,97 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Type
+
+_current: ContextVar[Optional["IdentityMap"]] = ContextVar(
+    "identity_map", default=None
+)
+
+
+class IdentityMap:
+    # least recently used entries are evicted once max_size is reached, per
+    # table, so long migrations don't grow without bound
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self.objects: OrderedDict = OrderedDict()
+        self.lookups: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, table: OrderedDict, key: Hashable) -> Any:
+        obj = table.get(key)
+        if obj is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        table.move_to_end(key)
+        return obj
+
+    def _put(self, table: OrderedDict, key: Hashable, obj: Any):
+        table[key] = obj
+        table.move_to_end(key)
+        while len(table) > self.max_size:
+            table.popitem(last=False)
+
+    def get(self, cls: Type, id: int) -> Any:
+        return self._get(self.objects, (cls, id))
+
+    def add(self, obj: Any):
+        if obj.id is not None:
+            self._put(self.objects, (type(obj), obj.id), obj)
+
+    def get_lookup(self, cls: Type, key: Hashable) -> Any:
+        return self._get(self.lookups, (cls, key))
+
+    def add_lookup(self, cls: Type, key: Hashable, obj: Any):
+        self._put(self.lookups, (cls, key), obj)
+        self.add(obj)
+
+    def discard(self, obj: Any):
+        self.objects.pop((type(obj), obj.id), None)
+        for key in [k for k, v in self.lookups.items() if v is obj]:
+            del self.lookups[key]
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    return _current.get()
+
+
+@contextmanager
+def identity_map(max_size: int = 10_000):
+    imap = IdentityMap(max_size)
+    token = _current.set(imap)
+    try:
+        yield imap
+    finally:
+        _current.reset(token)
+
+
+class SingleFlight:
+    # identical concurrent calls share one task; the key is dropped as soon
+    # as that task finishes, so nothing is cached beyond the flight itself
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+        # shield so one caller being cancelled doesn't cancel the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+
+in_flight = SingleFlight()
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from selenium.common.exceptions import WebDriverException
+
+from browser_pool import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self, cookies, crash_on=()):
+        self.cookies = dict(cookies)
+        self.crash_on = set(crash_on)
+        self.quit_called = False
+        self.url = None
+
+    def get(self, url):
+        if url in self.crash_on:
+            raise WebDriverException("chrome not reachable")
+        time.sleep(0.01)
+        self.url = url
+
+    def execute_script(self, script):
+        return self.url.endswith("missing")
+
+    @property
+    def page_source(self):
+        return f"<html>{self.url} {self.cookies['session']}</html>"
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestBrowserPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.drivers = []
+        self.crash_on = set()
+        self.lock = threading.Lock()
+
+    def factory(self, cookies):
+        with self.lock:
+            driver = FakeDriver(cookies, self.crash_on)
+            self.drivers.append(driver)
+        return driver
+
+    async def test_pages_are_spread_over_a_bounded_pool(self):
+        async with BrowserPool(
+            {"session": "abc"}, size=3, factory=self.factory
+        ) as pool:
+            pages = await asyncio.gather(*(pool.fetch(f"u{i}") for i in range(12)))
+            self.assertEqual(pages[5], "<html>u5 abc</html>")
+            self.assertEqual(len(self.drivers), 3)
+            self.assertEqual(sum(w.pages for w in pool.workers), 12)
+            self.assertIsNone(await pool.fetch("missing"))
+        self.assertTrue(all(d.quit_called for d in self.drivers))
+
+    async def test_crashed_browser_is_replaced_and_page_retried(self):
+        self.crash_on.add("bad-once")
+        pool = BrowserPool({"session": "abc"}, size=1, factory=self.factory)
+        first = await pool.fetch("u")
+        self.crash_on.clear()
+        self.assertEqual(await pool.fetch("bad-once"), "<html>bad-once abc</html>")
+        self.assertEqual(first, "<html>u abc</html>")
+        self.assertEqual(len(self.drivers), 2)
+        self.assertTrue(self.drivers[0].quit_called)
+        self.assertEqual(pool.recycled, 1)
+        await pool.close()
+
+    async def test_browsers_are_recycled_after_max_pages(self):
+        pool = BrowserPool(
+            {"session": "abc"}, size=1, max_pages=2, factory=self.factory
+        )
+        for i in range(5):
+            await pool.fetch(f"u{i}")
+        self.assertEqual(len(self.drivers), 3)
+        self.assertEqual(pool.recycled, 2)
+        await pool.close()
+
+    async def test_waiters_are_woken_when_a_browser_fails_to_start(self):
+        def factory(cookies):
+            time.sleep(0.01)
+            raise WebDriverException("chrome not found")
+
+        pool = BrowserPool({"session": "abc"}, size=1, factory=factory)
+        results = await asyncio.wait_for(
+            asyncio.gather(pool.fetch("a"), pool.fetch("b"), return_exceptions=True),
+            timeout=5,
+        )
+        self.assertTrue(all(isinstance(r, WebDriverException) for r in results))
+        self.assertEqual(pool.started, 2)
+        self.assertEqual((pool.workers, pool.starting), ([], 0))
+
+    async def test_waiters_are_woken_when_a_replacement_fails(self):
+        failing = False
+
+        def factory(cookies):
+            if failing:
+                raise WebDriverException("chrome not found")
+            return self.factory(cookies)
+
+        self.crash_on.add("bad")
+        pool = BrowserPool({"session": "abc"}, size=1, factory=factory)
+        await pool.fetch("u")
+        failing = True
+        results = await asyncio.wait_for(
+            asyncio.gather(pool.fetch("bad"), pool.fetch("b"), return_exceptions=True),
+            timeout=5,
+        )
+        self.assertTrue(all(isinstance(r, WebDriverException) for r in results))
+        self.assertTrue(self.drivers[0].quit_called)
+        self.assertEqual((pool.workers, pool.starting), ([], 0))
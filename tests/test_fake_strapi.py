@@ -0,0 +1,291 @@
+import os
+import socket
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+try:
+    import boto3  # noqa: F401
+    from moto.server import ThreadedMotoServer
+except ImportError:
+    ThreadedMotoServer = None
+
+import direct_upload
+import strapi_client
+import upload_index
+import strapi_models as M
+from fake_strapi import FakeStrapi, default_models
+from strapi_client import StrapiClient
+from strapi_query import Q
+from direct_upload import BucketConfig
+from upload_index import UploadIndex
+from upload_stream import MIN_BYTES_PER_SEC, ThroughputEstimate, UploadMetrics
+
+
+class FakeStrapiTestCase(unittest.IsolatedAsyncioTestCase):
+    fake_options: dict = {}
+
+    async def asyncSetUp(self):
+        self.server = TestServer(self.app())
+        await self.server.start_server()
+        self.previous_client = strapi_client.get_client()
+        self.client = StrapiClient(base_url=str(self.server.make_url("")).rstrip("/"))
+        strapi_client.set_client(self.client)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        strapi_client.set_client(self.previous_client)
+        await self.server.close()
+
+    def app(self) -> web.Application:
+        # override to serve hand-written routes instead of the fake
+        self.fake = FakeStrapi(default_models(), **self.fake_options)
+        return self.fake.app()
+
+    def write_file(self, name: str, size: int) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = UploadIndex(os.path.join(self.tmp.name, "index.sqlite3"))
+        upload_index.set_index(self.index)
+        self.addCleanup(upload_index.set_index, None)
+        self.addCleanup(self.index.close)
+
+
+class TestFakeStrapi(FakeStrapiTestCase):
+    async def test_full_push(self):
+        course, created = await M.Course.get_or_create(title="a")
+        self.assertTrue(created)
+        category, _ = await M.CourseCategory.get_or_create(name="b", course=course)
+        subcategory, _ = await M.CourseSubcategory.get_or_create(
+            name="c", course_category=category
+        )
+        video_file = await M.Media.upload_file(self.write_file("v.mp4", 2048))
+        self.assertIsInstance(video_file, M.Media)
+        post = await M.PostCourseVideo(
+            title="hello world",
+            video_file=video_file,
+            course_subcategory=subcategory,
+        ).post()
+        self.assertIsInstance(post.id, int)
+
+        fetched = await M.PostCourseVideo.get(title="hello world")
+        self.assertEqual(fetched.video_file.url, video_file.url)
+        self.assertEqual(fetched.course_subcategory.name, "c")
+        self.assertEqual(fetched.course_subcategory.course_category.name, "b")
+        _, created = await M.Course.get_or_create(title="a")
+        self.assertFalse(created)
+
+    async def test_filters_and_projection(self):
+        with_audio = await M.Media.upload_file(self.write_file("a.mp3", 16))
+        for i in range(30):
+            await M.PostCourseVideo(
+                title=f"v{i}",
+                episode=i,
+                audio_file=with_audio if i % 3 == 0 else None,
+            ).post()
+        videos = [
+            v
+            async for v in M.PostCourseVideo.iter(
+                page_size=7,
+                fields=["title"],
+                populate={"audio_file": ["url"]},
+                filters=Q(audio_file__id__null=True, episode__gte=10),
+            )
+        ]
+        self.assertEqual(len(videos), 14)
+        self.assertTrue(all(v.audio_file is None for v in videos))
+        self.assertFalse(videos[0].is_set("episode"))
+
+    async def test_writing_the_filtered_field_while_iterating(self):
+        # audioer/thumbnailer/converter: select the rows missing a field,
+        # then fill it in while later pages are still to be fetched
+        audio = await M.Media.upload_file(self.write_file("a.mp3", 16))
+        for i in range(50):
+            await M.PostCourseVideo(title=f"v{i}").post()
+        seen = []
+        async for video in M.PostCourseVideo.iter(
+            page_size=7, fields=["title"], filters=Q(audio_file__id__null=True)
+        ):
+            seen.append(video.id)
+            video.audio_file = audio
+            await video.put()
+        self.assertEqual(len(seen), 50)
+        self.assertEqual(len(set(seen)), 50)
+
+    async def test_put_and_delete(self):
+        author = await M.Author(name="x").post()
+        author.name = "y"
+        await author.put()
+        self.assertEqual((await M.Author.get(name="y")).id, author.id)
+        await author.delete()
+        self.assertIsNone(await M.Author.get(name="y"))
+
+
+class TestUploadDedupe(FakeStrapiTestCase):
+    async def test_same_content_uploads_once(self):
+        path = self.write_file("a.jpg", 4096)
+        first = await M.Media.upload_file(path)
+        second = await M.Media.upload_file(path)
+        self.assertEqual(first, second)
+        self.assertEqual(self.fake.uploaded_bytes, 4096)
+
+    async def test_verify_reuploads_when_strapi_lost_the_file(self):
+        path = self.write_file("a.jpg", 4096)
+        first = await M.Media.upload_file(path)
+        self.assertEqual(await M.Media.upload_file(path, verify=True), first)
+        del self.fake.rows["upload"][first.id]
+        second = await M.Media.upload_file(path, verify=True)
+        self.assertNotEqual(second.id, first.id)
+        self.assertEqual(self.fake.uploaded_bytes, 8192)
+
+
+class TestStreamingUpload(FakeStrapiTestCase):
+    async def test_progress_and_metrics(self):
+        path = self.write_file("big.mp4", 10 * 1024 + 1)
+        calls = []
+        media = await M.Media.upload_file(
+            path, chunk_size=1024, progress=lambda sent, total: calls.append(sent)
+        )
+        self.assertEqual(media.name, "big.mp4")
+        self.assertEqual(len(calls), 11)
+        self.assertEqual(calls[-1], 10 * 1024 + 1)
+        self.assertEqual(self.fake.uploaded_bytes, 10 * 1024 + 1)
+
+    def test_timeout_scales_with_size(self):
+        estimate = ThroughputEstimate(initial=1e6)
+        small = estimate.timeout(1e6).total
+        large = estimate.timeout(1e9).total
+        self.assertAlmostEqual(small, 60 + 3)
+        self.assertAlmostEqual(large, 60 + 3000)
+        self.assertAlmostEqual(
+            ThroughputEstimate(initial=1).timeout(1e9).total,
+            60 + 3 * 1e9 / MIN_BYTES_PER_SEC,
+        )
+        estimate.observe(UploadMetrics("x", int(1e8), 1.0))
+        self.assertLess(estimate.timeout(1e9).total, large)
+
+
+class TestUploadMany(FakeStrapiTestCase):
+    async def test_results_keep_input_order(self):
+        paths = [
+            self.write_file("video.mp4", 64 * 1024),
+            os.path.join(self.tmp.name, "missing.mp3"),
+            self.write_file("thumb.jpg", 1024),
+            self.write_file("audio.mp3", 2048),
+        ]
+        media = await M.Media.upload_many(paths, small_file_size=4096)
+        self.assertEqual(
+            [m.name if m else None for m in media],
+            ["video.mp4", None, "thumb.jpg", "audio.mp3"],
+        )
+        # one request for the two small files, one for the large one
+        self.assertEqual(self.fake.requests, 2)
+
+    async def test_batches_use_the_upload_index(self):
+        path = self.write_file("thumb.jpg", 1024)
+        first = await M.Media.upload_file(path)
+        self.fake.requests = 0
+        (second,) = await M.Media.upload_many([path])
+        self.assertEqual(first, second)
+        self.assertEqual(self.fake.requests, 0)
+
+
+class TestUploadManyFailures(FakeStrapiTestCase):
+    def app(self) -> web.Application:
+        @web.middleware
+        async def reject_large(request, handler):
+            if (request.content_length or 0) > 32 * 1024:
+                return web.Response(status=413, text="too large")
+            return await handler(request)
+
+        app = super().app()
+        app.middlewares.append(reject_large)
+        return app
+
+    async def test_a_failed_upload_keeps_the_others(self):
+        paths = [
+            self.write_file("video.mp4", 64 * 1024),
+            self.write_file("thumb.jpg", 1024),
+        ]
+        media = await M.Media.upload_many(paths, small_file_size=4096)
+        self.assertIsNone(media[0])
+        self.assertEqual(media[1].name, "thumb.jpg")
+
+
+@unittest.skipIf(ThreadedMotoServer is None, "moto[server] not installed")
+class TestDirectUpload(FakeStrapiTestCase):
+    @classmethod
+    def setUpClass(cls):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        cls.s3 = ThreadedMotoServer(port=port, verbose=False)
+        cls.s3.start()
+        cls.bucket = BucketConfig(
+            bucket="media",
+            public_url="https://cdn.example.com",
+            endpoint_url=f"http://127.0.0.1:{port}",
+            region="us-east-1",
+            access_key_id="test",
+            secret_access_key="test",
+            part_size=5 * 1024 * 1024,
+        )
+        cls.bucket.s3_client().create_bucket(Bucket="media")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.s3.stop()
+
+    async def test_multipart_upload_and_register(self):
+        path = self.write_file("big video.mp4", 12 * 1024 * 1024)
+        seen = []
+        media = await M.Media.upload_file(
+            path,
+            direct=True,
+            bucket=self.bucket,
+            progress=lambda sent, total: seen.append((sent, total)),
+        )
+        self.assertIsInstance(media, M.Media)
+        self.assertEqual(media.mime, "video/mp4")
+        self.assertTrue(media.hash.startswith("big_video_"))
+        self.assertEqual(media.url, f"https://cdn.example.com/{media.hash}.mp4")
+        self.assertEqual(self.fake.rows["upload"][media.id]["url"], media.url)
+        head = self.bucket.s3_client().head_object(
+            Bucket="media", Key=f"{media.hash}.mp4"
+        )
+        self.assertEqual(head["ContentLength"], 12 * 1024 * 1024)
+        self.assertTrue(head["ETag"].strip('"').endswith("-3"))
+        self.assertEqual(seen[-1], (12 * 1024 * 1024, 12 * 1024 * 1024))
+
+    async def test_dedupe_skips_bucket(self):
+        path = self.write_file("a.mp3", 1024)
+        first = await M.Media.upload_file(path, direct=True, bucket=self.bucket)
+        second = await M.Media.upload_file(path, direct=True, bucket=self.bucket)
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(len(self.fake.rows["upload"]), 1)
+
+    async def test_missing_register_route_is_named(self):
+        path = self.write_file("a.mp3", 1024)
+        register_path = direct_upload.REGISTER_PATH
+        direct_upload.REGISTER_PATH = "/custom/register"
+        self.addCleanup(setattr, direct_upload, "REGISTER_PATH", register_path)
+        with self.assertRaisesRegex(
+            direct_upload.RegisterRouteMissing, "STRAPI_UPLOAD_REGISTER_PATH"
+        ):
+            await M.Media.upload_file(path, direct=True, bucket=self.bucket)
+
+
+class TestFakeStrapiErrors(FakeStrapiTestCase):
+    fake_options = {"error_rate": 1.0}
+
+    async def test_injected_errors_surface(self):
+        with self.assertRaises(Exception):
+            await M.Author.all()
@@ -1,11 +1,116 @@
+import asyncio
 import os
 import shutil
 import unittest
 
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
 import kartra_api
+from portal_fetcher import PortalFetcher
 from vimeo_download import download_video
 
 
+class FakeDriver:
+    def __init__(self, cookies):
+        self.cookies = cookies
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestLazyDriver(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+        self.create_driver = kartra_api.create_driver
+        kartra_api.create_driver = self.factory
+
+    def tearDown(self):
+        kartra_api.close_driver()
+        kartra_api.create_driver = self.create_driver
+
+    def factory(self, cookies):
+        driver = FakeDriver(cookies)
+        self.created.append(driver)
+        return driver
+
+    def test_import_does_not_start_a_browser(self):
+        self.assertIsNone(kartra_api._driver)
+
+    def test_driver_is_started_once_and_closed_with_the_block(self):
+        with kartra_api.browser():
+            self.assertEqual(self.created, [])
+            driver = kartra_api.get_driver()
+            self.assertIs(kartra_api.get_driver(), driver)
+        self.assertEqual(self.created, [driver])
+        self.assertTrue(driver.quit_called)
+        self.assertIsNone(kartra_api._driver)
+
+
+class TestResolveVimeoIds(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.active = 0
+        self.peak = 0
+
+        async def post(request):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            post_id = int(request.match_info["id"])
+            if post_id == 404:
+                return web.Response(status=404, text="nope")
+            video = (
+                f"<div data-video_source='vimeo' data-video_source_id='v{post_id}'>"
+                if post_id % 2
+                else "<p>no video</p>"
+            )
+            return web.Response(
+                text=f"<div class='{kartra_api.POST_MARKER}'>{video}</div>"
+            )
+
+        app = web.Application()
+        app.router.add_get("/portal/{course}/post/{id}", post)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.fetcher = PortalFetcher(rate_limit=1000, concurrency=10)
+        self.kartra_url = kartra_api.KARTRA_URL
+        kartra_api.KARTRA_URL = str(self.server.make_url("/portal"))
+
+    async def asyncTearDown(self):
+        kartra_api.KARTRA_URL = self.kartra_url
+        await self.fetcher.close()
+        await self.server.close()
+
+    def post(self, post_id):
+        course = kartra_api.KartraCourse(id="c")
+        category = kartra_api.KartraCategory(name="cat", course=course)
+        return kartra_api.KartraPost(
+            id=post_id,
+            name=f"post {post_id}",
+            course=course,
+            category=category,
+            subcategory=kartra_api.KartraSubcategory(
+                id=1, name="sub", course=course, category=category
+            ),
+        )
+
+    async def test_ids_are_resolved_concurrently(self):
+        posts = [self.post(i) for i in range(1, 9)] + [self.post(404)]
+        missing = await kartra_api.resolve_vimeo_ids(
+            posts, self.fetcher, concurrency=3
+        )
+        self.assertEqual([p.id for p in missing], [2, 4, 6, 8])
+        self.assertEqual([p.vimeo_id for p in posts[:4]], ["v1", None, "v3", None])
+        self.assertEqual(self.peak, 3)
+        # the post that failed can be retried, the others aren't fetched again
+        self.assertFalse(hasattr(posts[-1], "_fetched"))
+        self.assertEqual(self.fetcher.fetched, 9)
+        await posts[0].fetch_async(self.fetcher)
+        self.assertEqual(self.fetcher.fetched, 9)
+
+
 class TestKartraRoutes(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
         self.client = kartra_api.KartraClient()
@@ -0,0 +1,127 @@
+import unittest
+
+import kartra_api
+import kartra_parser
+
+INDEX = """<!DOCTYPE html>
+<html><head><title>Course</title><script>var nav = "<ul>";</script></head>
+<body>
+<div class="nav list-unstyled-extra"><li class="dropdown"><a>decoy</a></li></div>
+<ul class="nav  list-unstyled">
+  <li class="dropdown open">
+    <a href="#">  Season &amp; One </a>
+    <ul class="dropdown-menu">
+      <!-- hidden -->
+      <li><a href="/portal/c/subcategory/11"><span class="dropdown_title">
+        Intro</span></a></li>
+      <li><a href="/portal/c/post/21"><span class="dropdown_title">Bonus
+        <b>video</b></span></a></li>
+    </ul>
+  </li>
+  <li class="dropdown">
+    <a href="#">Two</a>
+    <ul><li><a href="/portal/c/subcategory/12">
+      <div class="dropdown_title">Deep dive</div></a></li></ul>
+  </li>
+</ul>
+</body></html>
+"""
+
+SUBCATEGORY = """<html><body>
+<div class="panel panel-blank"><div class="panel-body"><ul>
+  <li class="js_menu_item_navigation_element" data-item_id="99"><span>no</span></li>
+</ul></div></div>
+<div class="panel panel-blank menu_box">
+  <div class="panel-heading">Intro</div>
+  <div class="panel-body"><ul>
+    <li class="js_menu_item_navigation_element active" data-item_id="31">
+      <a><span> First &lt;one&gt; </span></a></li>
+    <li class="js_menu_item_navigation_element" data-item_id="32">
+      <a><span>Second</span><span>ignored</span></a></li>
+  </ul></div>
+</div>
+</body></html>
+"""
+
+POST = """<html><body>
+<div class="panel panel-kartra-sidebar"><div data-video_source="vimeo"
+  data-video_source_id="0"></div></div>
+<div class="panel panel-kartra">
+  <div data-video_source="youtube" data-video_source_id="yt"></div>
+  <div class="video"><div data-video_source="vimeo" data-video_source_id="123456">
+  </div></div>
+</div>
+</body></html>
+"""
+
+POST_WITHOUT_VIDEO = """<html><body><div class="panel panel-kartra">
+<p>text only</p></div></body></html>"""
+
+
+class TestKartraParsers(unittest.TestCase):
+    def parsers(self):
+        return [
+            kartra_parser.PARSERS[name]()
+            for name in kartra_parser.available_parsers()
+        ]
+
+    def test_index(self):
+        expected = [
+            (
+                "Season & One",
+                [
+                    ("Intro", "/portal/c/subcategory/11"),
+                    ("Bonus\n        video", "/portal/c/post/21"),
+                ],
+            ),
+            ("Two", [("Deep dive", "/portal/c/subcategory/12")]),
+        ]
+        for parser in self.parsers():
+            self.assertEqual(parser.index(INDEX), expected)
+
+    def test_subcategory(self):
+        expected = [("31", "First <one>"), ("32", "Second")]
+        for parser in self.parsers():
+            self.assertEqual(parser.subcategory(SUBCATEGORY), expected)
+
+    def test_post(self):
+        for parser in self.parsers():
+            self.assertEqual(parser.post(POST), "123456")
+            self.assertIsNone(parser.post(POST_WITHOUT_VIDEO))
+
+    def test_pages_without_the_marker_fail(self):
+        for parser in self.parsers():
+            for parse in (parser.index, parser.subcategory, parser.post):
+                with self.assertRaises(AssertionError):
+                    parse("<html><body><div id='app'></div></body></html>")
+
+
+class TestKartraApiParsing(unittest.TestCase):
+    def tearDown(self):
+        kartra_parser.set_parser(None)
+
+    def test_models_are_the_same_with_every_parser(self):
+        course = kartra_api.KartraCourse(id="c")
+        results = []
+        for name in kartra_parser.available_parsers():
+            kartra_parser.set_parser(name)
+            items = kartra_api.parse_index(INDEX, course)
+            posts = kartra_api.parse_subcategory_page(SUBCATEGORY, items[0])
+            post = kartra_api.KartraPost.model_validate(posts[0].model_dump())
+            results.append(
+                (
+                    [item.model_dump() for item in items],
+                    [p.model_dump() for p in posts],
+                    post.parse(POST).vimeo_id,
+                )
+            )
+        items, posts, vimeo_id = results[0]
+        self.assertEqual(
+            [item["name"] for item in items],
+            ["Intro", "Bonus\n        video", "Deep dive"],
+        )
+        self.assertEqual(items[1]["subcategory"]["name"], "Season & One")
+        self.assertEqual([p["id"] for p in posts], [31, 32])
+        self.assertEqual(vimeo_id, "123456")
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
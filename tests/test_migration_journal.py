@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from migration_journal import MigrationJournal
+
+
+class TestMigrationJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "journal.sqlite3")
+        self.journal = MigrationJournal(self.path)
+        self.addCleanup(self.journal.close)
+        self.journal.record_scrape(
+            "course", [{"id": 1, "name": "one"}, {"id": 2, "name": "two"}]
+        )
+
+    def test_scrape_is_remembered(self):
+        self.assertTrue(self.journal.is_scraped("course"))
+        self.assertFalse(self.journal.is_scraped("other"))
+        self.assertEqual(
+            [p["name"] for p in self.journal.posts("course")], ["one", "two"]
+        )
+
+    def test_progress_survives_a_restart(self):
+        self.journal.advance(1, "checked", subcategory_id=7)
+        self.journal.advance(1, "uploaded", media=[3, 4, None])
+        self.journal.close()
+        journal = MigrationJournal(self.path)
+        entry = journal.get(1)
+        self.assertEqual(entry["state"], "uploaded")
+        self.assertEqual(entry["subcategory_id"], 7)
+        self.assertEqual(entry["media"], [3, 4, None])
+        self.assertTrue(journal.reached(1, "downloaded"))
+        self.assertFalse(journal.reached(1, "posted"))
+        self.assertFalse(journal.reached(2, "checked"))
+        # rescraping keeps the progress
+        journal.record_scrape("course", [{"id": 1, "name": "one"}])
+        self.assertEqual(journal.get(1)["state"], "uploaded")
+        journal.close()
+
+    def test_failures_are_recorded_until_the_stage_succeeds(self):
+        self.journal.advance(1, "resolved", video_id="123")
+        self.journal.fail(1, "download", "timeout")
+        self.journal.fail(1, "download", "timeout")
+        (failure,) = self.journal.failures()
+        self.assertEqual(failure["attempts"], 2)
+        self.assertEqual(failure["state"], "resolved")
+        self.assertEqual(
+            self.journal.summary(),
+            {"course": {"failed after resolved": 1, "scraped": 1}},
+        )
+        self.journal.advance(1, "downloaded")
+        self.assertEqual(self.journal.failures(), [])
+
+    def test_finished_posts_count_as_past_every_stage(self):
+        self.journal.advance(2, "skipped")
+        self.assertTrue(self.journal.reached(2, "uploaded"))
+
+    def test_rescrape_adds_new_posts(self):
+        self.journal.advance(1, "posted", strapi_id=5)
+        self.journal.record_scrape(
+            "course",
+            [{"id": 1, "name": "one"}, {"id": 2, "name": "two"}, {"id": 3, "name": "3"}],
+        )
+        self.assertEqual([p["id"] for p in self.journal.posts("course")], [1, 2, 3])
+        self.assertEqual(self.journal.get(1)["state"], "posted")
+        self.assertEqual(self.journal.get(3)["state"], "scraped")
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import strapi_models as M
+from migration_plan import MigrationPlan, StrapiTree, create_parents, diff
+from test_fake_strapi import FakeStrapiTestCase
+
+
+def kartra_post(id, name, course="c1", category="cat", subcategory="sub"):
+    return SimpleNamespace(
+        id=id,
+        name=name,
+        course=SimpleNamespace(id=course),
+        category=SimpleNamespace(name=category),
+        subcategory=SimpleNamespace(name=subcategory),
+    )
+
+
+class TestMigrationPlan(FakeStrapiTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        course = self.fake.insert("courses", {"title": "c1"})
+        category = self.fake.insert(
+            "course-categories", {"name": "cat", "course": course["id"]}
+        )
+        subcategory = self.fake.insert(
+            "course-subcategories",
+            {"name": "sub", "course_category": category["id"]},
+        )
+        self.existing = self.fake.insert(
+            "post-course-videos",
+            {"title": "old", "course_subcategory": subcategory["id"]},
+        )
+
+    async def test_only_missing_rows_are_planned(self):
+        tree = await StrapiTree.load()
+        self.fake.requests = 0
+        plan = diff(
+            tree,
+            [
+                kartra_post(1, "old"),
+                kartra_post(2, "new"),
+                kartra_post(3, "other", subcategory="sub2"),
+                kartra_post(4, "elsewhere", "c2", "cat2", "sub3"),
+            ],
+        )
+        self.assertEqual(self.fake.requests, 0)
+        self.assertEqual(plan.existing, {1: self.existing["id"]})
+        self.assertEqual([p.id for p in plan.posts], [2, 3, 4])
+        self.assertEqual(plan.courses, ["c2"])
+        self.assertEqual(plan.categories, [("c2", "cat2")])
+        self.assertEqual(plan.subcategories, [("cat", "sub2"), ("cat2", "sub3")])
+        self.assertIn(
+            "create 1 courses, 1 categories, 2 subcategories, 3 posts",
+            plan.summary(),
+        )
+
+    async def test_parents_are_created_under_each_other(self):
+        posts = [kartra_post(4, "elsewhere", "c2", "cat2", "sub3")]
+        tree = await StrapiTree.load()
+        plan = diff(tree, posts)
+        subcategory_ids = await create_parents(plan, tree)
+        subcategory = await M.CourseSubcategory.get(
+            name="sub3", populate={"course_category": {"course": ["title"]}}
+        )
+        self.assertEqual(subcategory.id, subcategory_ids["sub3"])
+        self.assertEqual(subcategory.course_category.name, "cat2")
+        self.assertEqual(subcategory.course_category.course.title, "c2")
+        again = diff(await StrapiTree.load(), posts)
+        self.assertEqual(
+            (again.courses, again.categories, again.subcategories), ([], [], [])
+        )
+
+    def test_transfer_estimate_scales_the_sample(self):
+        plan = MigrationPlan(posts=[kartra_post(i, str(i)) for i in range(10)])
+        plan.estimate_bytes({1: "a", 2: "b"}, {"a": 100, "b": 300}.get)
+        self.assertEqual((plan.estimated_bytes, plan.estimated_from), (2000, 2))
+        self.assertIn("2.0 GB", MigrationPlan(estimated_bytes=2 * 10**9).summary())
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from page_cache import PageCache, PageNotCached
+from portal_fetcher import PortalFetcher
+
+MARKER = "panel panel-kartra"
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "pages.sqlite3")
+
+    def test_pages_survive_a_restart_compressed(self):
+        cache = PageCache(self.path)
+        html = "<div>" + "lorem ipsum " * 1000 + "</div>"
+        cache.store("a", html, etag='"1"')
+        cache.store("missing", None)
+        cache.close()
+        cache = PageCache(self.path)
+        self.addCleanup(cache.close)
+        self.assertEqual(cache.lookup("a").html, html)
+        self.assertEqual(cache.get("a").etag, '"1"')
+        self.assertIsNone(cache.lookup("missing").html)
+        self.assertIsNone(cache.lookup("b"))
+        (size,) = cache.db.execute("SELECT LENGTH(html) FROM pages").fetchone()
+        self.assertLess(size, len(html) / 10)
+
+    def test_stale_pages_need_revalidating(self):
+        cache = PageCache(self.path, ttl=0)
+        self.addCleanup(cache.close)
+        cache.store("a", "<div></div>", etag='"1"', last_modified="yesterday")
+        self.assertIsNone(cache.lookup("a"))
+        self.assertEqual(
+            PageCache.conditional_headers(cache.get("a")),
+            {"If-None-Match": '"1"', "If-Modified-Since": "yesterday"},
+        )
+        cache.offline = True
+        self.assertEqual(cache.lookup("a").html, "<div></div>")
+        with self.assertRaises(PageNotCached):
+            cache.lookup("b")
+
+
+class TestCachedPortalFetcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = PageCache(os.path.join(self.tmp.name, "pages.sqlite3"))
+        self.addCleanup(self.cache.close)
+        self.requests = []
+        self.version = "1"
+
+        async def page(request):
+            name = request.match_info["name"]
+            self.requests.append((name, request.headers.get("If-None-Match")))
+            etag = f'"{self.version}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            if name == "js":
+                text = "<div id='app'></div>"
+            else:
+                text = f"<div class='{MARKER}'>{name} v{self.version}</div>"
+            return web.Response(text=text, headers={"ETag": etag})
+
+        app = web.Application()
+        app.router.add_get("/portal/{name}", page)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.rendered = []
+
+        def fallback(url):
+            self.rendered.append(url)
+            return f"<div class='{MARKER}'>rendered</div>"
+
+        self.fetcher = PortalFetcher(
+            fallback=fallback, rate_limit=1000, cache=self.cache
+        )
+
+    async def asyncTearDown(self):
+        await self.fetcher.close()
+        await self.server.close()
+
+    def url(self, name):
+        return str(self.server.make_url(f"/portal/{name}"))
+
+    async def test_fresh_pages_come_from_the_cache(self):
+        first = await self.fetcher.fetch(self.url("a"), MARKER)
+        second = await self.fetcher.fetch(self.url("a"), MARKER)
+        self.assertEqual(first, second)
+        self.assertEqual(self.requests, [("a", None)])
+
+    async def test_stale_pages_are_revalidated(self):
+        self.cache.ttl = 0
+        await self.fetcher.fetch(self.url("a"), MARKER)
+        self.assertIn("v1", await self.fetcher.fetch(self.url("a"), MARKER))
+        self.version = "2"
+        self.assertIn("v2", await self.fetcher.fetch(self.url("a"), MARKER))
+        self.assertEqual(self.requests, [("a", None), ("a", '"1"'), ("a", '"1"')])
+        self.assertEqual(self.cache.revalidated, 1)
+
+    async def test_renderings_are_cached_and_revalidated(self):
+        self.cache.ttl = 0
+        await self.fetcher.fetch(self.url("js"), MARKER)
+        html = await self.fetcher.fetch(self.url("js"), MARKER)
+        self.assertIn("rendered", html)
+        self.assertEqual(self.rendered, [self.url("js")])
+
+    async def test_offline_never_touches_the_network(self):
+        await self.fetcher.fetch(self.url("a"), MARKER)
+        self.cache.offline = True
+        self.cache.ttl = 0
+        self.assertIn("v1", await self.fetcher.fetch(self.url("a"), MARKER))
+        with self.assertRaises(PageNotCached):
+            await self.fetcher.fetch(self.url("b"), MARKER)
+        self.assertEqual(self.requests, [("a", None)])
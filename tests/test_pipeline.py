@@ -0,0 +1,94 @@
+import asyncio
+import time
+import unittest
+
+from pipeline import Pipeline, Stage
+
+
+class TestPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_items_flow_through_every_stage(self):
+        finished = []
+
+        async def double(x):
+            await asyncio.sleep(0)
+            return x * 2
+
+        def drop_multiples_of_three(x):
+            return None if x % 3 == 0 else x
+
+        pipeline = Pipeline(
+            [
+                Stage("split", lambda n: range(n), blocking=True, fan_out=True),
+                Stage("double", double, workers=3),
+                Stage("filter", drop_multiples_of_three, blocking=True),
+            ],
+            finalize=finished.append,
+        )
+        stats = await pipeline.run([3, 4])
+        self.assertEqual(sorted(finished), [0, 0, 2, 2, 4, 4, 6])
+        self.assertEqual([s.processed for s in stats], [2, 7, 4])
+        self.assertEqual(stats[2].dropped, 3)
+
+    async def test_failures_are_counted_and_finalized(self):
+        finished = []
+
+        async def explode(x):
+            if x == 2:
+                raise ValueError("boom")
+            return x
+
+        errors = []
+        pipeline = Pipeline(
+            [Stage("explode", explode)],
+            finalize=finished.append,
+            on_error=lambda stage, item, e: errors.append((stage, item, str(e))),
+        )
+        (stats,) = await pipeline.run(range(4))
+        self.assertEqual((stats.processed, stats.failed), (3, 1))
+        self.assertEqual(sorted(finished), [0, 1, 2, 3])
+        self.assertEqual(errors, [("explode", 2, "boom")])
+
+    async def test_backpressure_bounds_items_in_flight(self):
+        in_flight = 0
+        peak = 0
+
+        async def start(x):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            return x
+
+        async def slow(x):
+            nonlocal in_flight
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+            return x
+
+        pipeline = Pipeline(
+            [Stage("start", start), Stage("slow", slow, workers=2, queue_size=3)]
+        )
+        await pipeline.run(range(50))
+        # one waiting to be queued + the queue + the workers
+        self.assertLessEqual(peak, 1 + 3 + 2)
+
+    async def test_shared_lock_serializes_stages(self):
+        lock = asyncio.Lock()
+        active = 0
+        overlapped = False
+
+        def browse(x):
+            nonlocal active, overlapped
+            active += 1
+            overlapped |= active > 1
+            time.sleep(0.001)
+            active -= 1
+            return x
+
+        pipeline = Pipeline(
+            [
+                Stage("a", browse, workers=2, blocking=True, lock=lock),
+                Stage("b", browse, workers=2, blocking=True, lock=lock),
+            ]
+        )
+        await pipeline.run(range(20))
+        self.assertFalse(overlapped)
@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from portal_fetcher import PortalFetcher
+
+
+class TestPortalFetcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cookies_seen = []
+        self.active = 0
+        self.peak = 0
+
+        async def page(request):
+            self.cookies_seen.append(request.cookies.get("session"))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            name = request.match_info["name"]
+            if name == "missing":
+                return web.Response(status=404, text="nope")
+            if name == "soft-missing":
+                return web.Response(text="<title>404 | Kartra</title>")
+            if name == "js":
+                return web.Response(text="<div id='app'></div>")
+            return web.Response(text=f"<div class='panel panel-kartra'>{name}</div>")
+
+        app = web.Application()
+        app.router.add_get("/portal/{name}", page)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.rendered = []
+
+        def fallback(url):
+            self.rendered.append(url)
+            return "<div class='panel panel-kartra'>rendered</div>"
+
+        self.fetcher = PortalFetcher(
+            cookies={"session": "abc"},
+            fallback=fallback,
+            concurrency=3,
+            rate_limit=1000,
+        )
+
+    async def asyncTearDown(self):
+        await self.fetcher.close()
+        await self.server.close()
+
+    def url(self, name):
+        return str(self.server.make_url(f"/portal/{name}"))
+
+    async def test_pages_are_fetched_concurrently_with_cookies(self):
+        pages = await asyncio.gather(
+            *(self.fetcher.fetch(self.url(i), "panel panel-kartra") for i in range(9))
+        )
+        self.assertTrue(all("panel panel-kartra" in page for page in pages))
+        self.assertEqual(self.cookies_seen, ["abc"] * 9)
+        self.assertEqual(self.peak, 3)
+        self.assertEqual(self.rendered, [])
+
+    async def test_missing_pages_return_none(self):
+        self.assertIsNone(await self.fetcher.fetch(self.url("missing")))
+        self.assertIsNone(await self.fetcher.fetch(self.url("soft-missing")))
+
+    async def test_pages_without_the_marker_fall_back_to_the_browser(self):
+        html = await self.fetcher.fetch(self.url("js"), "panel panel-kartra")
+        self.assertIn("rendered", html)
+        self.assertEqual(self.rendered, [self.url("js")])
+        self.assertEqual(self.fetcher.fallbacks, 1)
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from scratch import ScratchSpace
+
+
+class TestScratchSpace(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    async def test_jobs_get_separate_directories_removed_afterwards(self):
+        scratch = ScratchSpace(self.tmp.name, budget=100)
+        async with scratch.job("a", size=10) as a, scratch.job("a", size=10) as b:
+            self.assertNotEqual(a.path, b.path)
+            with open(a.file("x.mp4"), "wb") as f:
+                f.write(b"12345")
+            self.assertEqual(a.size(), 5)
+            self.assertEqual(scratch.reserved, 20)
+        self.assertFalse(os.path.exists(a.path))
+        self.assertFalse(os.path.exists(b.path))
+        self.assertEqual(scratch.reserved, 0)
+
+    async def test_jobs_wait_for_budget(self):
+        scratch = ScratchSpace(self.tmp.name, budget=100)
+        running = 0
+        peak = 0
+
+        async def job(i):
+            nonlocal running, peak
+            async with scratch.job(str(i), size=40):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*map(job, range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(scratch.reserved, 0)
+
+    async def test_oversized_job_runs_alone(self):
+        scratch = ScratchSpace(self.tmp.name, budget=10)
+        async with scratch.job("big", size=50):
+            self.assertEqual(scratch.reserved, 50)
+
+    async def test_failed_job_is_cleaned_up(self):
+        scratch = ScratchSpace(self.tmp.name, budget=10)
+        with self.assertRaises(RuntimeError):
+            async with scratch.job("boom", size=5) as job:
+                raise RuntimeError()
+        self.assertFalse(os.path.exists(job.path))
+        self.assertEqual(scratch.reserved, 0)
+
+    def test_leftovers_of_dead_processes_are_removed(self):
+        # pids are far below this on linux
+        stale = [
+            os.path.join(self.tmp.name, name)
+            for name in ("999999999", "999999999-x1y2")
+        ]
+        for path in stale:
+            os.makedirs(os.path.join(path, "1-job"))
+        ScratchSpace(self.tmp.name)
+        for path in stale:
+            self.assertFalse(os.path.exists(path))
+
+    async def test_a_second_space_leaves_the_first_alone(self):
+        first = ScratchSpace(self.tmp.name, budget=100)
+        async with first.job("a", size=10) as job:
+            with open(job.file("x.mp4"), "wb") as f:
+                f.write(b"12345")
+            second = ScratchSpace(self.tmp.name, budget=100)
+            self.assertNotEqual(first.base, second.base)
+            self.assertEqual(job.size(), 5)
+
+    async def test_leftovers_under_our_own_pid_are_removed(self):
+        # e.g. pid 1 in a container, crashed and restarted
+        leftover = os.path.join(self.tmp.name, str(os.getpid()), "1-post-5")
+        os.makedirs(leftover)
+        scratch = ScratchSpace(self.tmp.name, budget=100)
+        self.assertFalse(os.path.exists(leftover))
+        async with scratch.job("post-5", size=10) as job:
+            self.assertTrue(os.path.isdir(job.path))
+            self.assertTrue(os.path.basename(job.path).startswith("1-post-5-"))
@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from strapi_client import StrapiClient
+
+
+async def ok(request):
+    return web.json_response({"data": []})
+
+
+class TestStrapiClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        app = web.Application()
+        app.router.add_get("/api/things", ok)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.client = StrapiClient(base_url=str(self.server.make_url("")).rstrip("/"))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def test_connections_are_reused(self):
+        async with self.client:
+            for _ in range(5):
+                async with self.client.get("/api/things") as response:
+                    self.assertEqual(response.status, 200)
+                    await response.json()
+        self.assertEqual(self.client.stats.requests, 5)
+        self.assertEqual(self.client.stats.opened, 1)
+        self.assertEqual(self.client.stats.reused, 4)
+        self.assertFalse(self.client.is_open)
+
+    async def test_reopens_after_close(self):
+        async with self.client.get("/api/things") as response:
+            self.assertEqual(response.status, 200)
+        await self.client.close()
+        async with self.client.get("/api/things") as response:
+            self.assertEqual(response.status, 200)
+        self.assertEqual(self.client.stats.opened, 2)
+
+
+class TestLoopChanges(unittest.TestCase):
+    def setUp(self):
+        self.client = StrapiClient(base_url="http://127.0.0.1:1")
+
+    async def open(self):
+        return self.client.session
+
+    async def open_and_close(self):
+        session = self.client.session
+        await self.client.close()
+        return session
+
+    def test_session_from_a_finished_loop_is_closed(self):
+        first = asyncio.run(self.open())
+        with self.assertWarns(ResourceWarning):
+            second = asyncio.run(self.open_and_close())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertTrue(first.connector is None and second.closed)
+
+    def test_close_from_another_loop(self):
+        session = asyncio.run(self.open())
+        with self.assertWarns(ResourceWarning):
+            asyncio.run(self.client.close())
+        self.assertTrue(session.closed)
+        self.assertFalse(self.client.is_open)
@@ -178,3 +178,57 @@ class TestCourseVideo(unittest.IsolatedAsyncioTestCase):
         assert isinstance(r, M.PostCourseVideo)
         assert r.title == title
         assert r.video_file == video_file
+
+
+class TestCompactModels(unittest.TestCase):
+    media = {
+        "id": 4,
+        "attributes": {
+            "name": "a.jpg",
+            "hash": "a_123",
+            "ext": ".jpg",
+            "mime": "image/jpeg",
+            "size": 10.5,
+            "url": "/uploads/a_123.jpg",
+            "provider": "local",
+            "createdAt": "x",
+            "updatedAt": "y",
+            "formats": {"thumbnail": {"url": "/uploads/thumbnail_a_123.jpg"}},
+            "provider_metadata": None,
+        },
+    }
+
+    def test_models_have_no_instance_dict(self):
+        obj = M.PostCourseVideo(
+            id=1, attributes={"title": "a", "thumbnail": {"data": self.media}}
+        )
+        self.assertIn("title", M.PostCourseVideo.__slots__)
+        with self.assertRaises(AttributeError):
+            obj.thumbnail.__dict__
+        self.assertIsNone(obj.episode)
+        self.assertFalse(obj.is_set("episode"))
+        self.assertTrue(obj.is_set("title"))
+
+    def test_undeclared_attributes_are_kept(self):
+        obj = M.Author(id=1, attributes={"name": "a", "locale": "en"})
+        self.assertEqual(obj.locale, "en")
+        self.assertEqual(obj.as_dict(), {"id": 1, "name": "a", "locale": "en"})
+
+    def test_formats_are_parsed_on_access(self):
+        media = M.Media.pre_process_field(self.media)
+        self.assertIsInstance(media._formats, str)
+        self.assertEqual(
+            media.formats["thumbnail"]["url"], "/uploads/thumbnail_a_123.jpg"
+        )
+        self.assertIsNone(media.provider_metadata)
+        self.assertEqual(media, M.Media.pre_process_field(self.media))
+        posted = media.serialize_to_post()
+        self.assertEqual(posted["formats"], self.media["attributes"]["formats"])
+        self.assertNotIn("_formats", posted)
+
+    def test_partial_media_projection(self):
+        media = M.Media.pre_process_field({"id": 1, "attributes": {"url": "/u"}})
+        self.assertEqual(media.url, "/u")
+        self.assertIsNone(media.hash)
+        with self.assertRaises(ValueError):
+            M.Media.pre_process_field({"id": 1, "attributes": {"nope": 1}})
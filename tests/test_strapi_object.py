@@ -0,0 +1,233 @@
+import asyncio
+
+from aiohttp import web
+
+import strapi_models as M
+from strapi_session import IdentityMap, identity_map
+from test_fake_strapi import FakeStrapiTestCase
+
+
+class TestIter(FakeStrapiTestCase):
+    def app(self) -> web.Application:
+        self.ids = set(range(25))
+        self.requests = []
+        app = web.Application()
+        app.router.add_get("/api/authors", self.authors)
+        return app
+
+    async def authors(self, request):
+        self.requests.append(dict(request.query))
+        after = int(request.query.get("filters[id][$gt]", -1))
+        page_size = int(request.query["pagination[pageSize]"])
+        ids = sorted(i for i in self.ids if i > after)
+        if request.query.get("sort[0]") != "id:asc":
+            # no order was asked for, and strapi doesn't promise one
+            ids.reverse()
+        return web.json_response(
+            {
+                "data": [
+                    {"id": i, "attributes": {"name": str(i)}}
+                    for i in ids[:page_size]
+                ],
+                "meta": {
+                    "pagination": {
+                        "page": 1,
+                        "pageCount": max(-(-len(ids) // page_size), 1),
+                    }
+                },
+            }
+        )
+
+    async def test_iter_yields_every_page_in_order(self):
+        ids = [author.id async for author in M.Author.iter(page_size=10)]
+        self.assertEqual(ids, list(range(25)))
+        self.assertEqual(
+            [r.get("filters[id][$gt]") for r in self.requests], [None, "9", "19"]
+        )
+
+    async def test_rows_changing_during_iteration_are_not_skipped(self):
+        ids = []
+        async for author in M.Author.iter(page_size=10, prefetch=False):
+            ids.append(author.id)
+            # updated out of the filter, and a new row
+            self.ids.discard(author.id)
+            if author.id == 12:
+                self.ids.add(100)
+        self.assertEqual(ids, list(range(25)) + [100])
+
+    async def test_all_uses_pagination(self):
+        authors = await M.Author.all()
+        self.assertEqual(len(authors), 25)
+        self.assertIsInstance(authors[0], M.Author)
+
+    async def test_early_exit_cancels_prefetch(self):
+        async for author in M.Author.iter(page_size=10, prefetch=1):
+            break
+        self.assertEqual(author.id, 0)
+
+
+class TestBulk(FakeStrapiTestCase):
+    def app(self) -> web.Application:
+        self.in_flight = 0
+        self.max_in_flight = 0
+        app = web.Application()
+        app.router.add_post("/api/authors", self.create_author)
+        return app
+
+    async def create_author(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        data = (await request.json())["data"]
+        if data["name"] == "bad":
+            return web.Response(status=400, text="bad name")
+        return web.json_response(
+            {"data": {"id": int(data["name"]), "attributes": data}}
+        )
+
+    async def test_bulk_create(self):
+        authors = [M.Author(name=str(i)) for i in range(20)] + [M.Author(name="bad")]
+        results = [
+            r async for r in M.Author.bulk_create(authors, concurrency=4, batch_size=8)
+        ]
+        self.assertEqual(len(results), 21)
+        self.assertLessEqual(self.max_in_flight, 4)
+        failed = [r for r in results if not r.ok]
+        self.assertEqual([r.obj.name for r in failed], ["bad"])
+        self.assertEqual(
+            sorted(r.obj.id for r in results if r.ok), list(range(20))
+        )
+
+
+class TestDirtyTracking(FakeStrapiTestCase):
+    def app(self) -> web.Application:
+        self.bodies = []
+        app = web.Application()
+        app.router.add_put("/api/post-course-videos/{id}", self.update_video)
+        return app
+
+    async def update_video(self, request):
+        data = (await request.json())["data"]
+        self.bodies.append(data)
+        return web.json_response(
+            {"data": {"id": int(request.match_info["id"]), "attributes": data}}
+        )
+
+    async def test_put_sends_only_changed_fields(self):
+        obj = M.PostCourseVideo(
+            id=3,
+            attributes={
+                "title": "test",
+                "transcript": None,
+                "course_subcategory": {"data": {"id": 1, "attributes": {"name": "c"}}},
+            },
+        )
+        self.assertEqual(obj.changes(), {})
+        await obj.put()
+        self.assertEqual(self.bodies, [])
+        obj.transcript = "hello"
+        await obj.put()
+        self.assertEqual(self.bodies, [{"transcript": "hello"}])
+        self.assertEqual(obj.changes(), {})
+
+    async def test_constructed_objects_are_dirty(self):
+        obj = M.PostCourseVideo(id=3, title="x")
+        await obj.put()
+        self.assertEqual(self.bodies, [{"title": "x"}])
+
+    async def test_nothing_to_send_skips_the_request(self):
+        obj = M.PostCourseVideo(id=3)
+        self.assertEqual(obj.changes(), {"id": 3})
+        await obj.put()
+        self.assertEqual(self.bodies, [])
+        self.assertEqual(obj.changes(), {})
+
+
+class TestIdentityMap(FakeStrapiTestCase):
+    def app(self) -> web.Application:
+        self.gets = 0
+        self.posts = 0
+        app = web.Application()
+        app.router.add_get("/api/course-categories", self.list_categories)
+        app.router.add_post("/api/course-categories", self.create_category)
+        return app
+
+    async def list_categories(self, request):
+        self.gets += 1
+        name = request.query["filters[name][$eq]"]
+        if name != "existing":
+            return web.json_response({"data": []})
+        return web.json_response({"data": [{"id": 1, "attributes": {"name": name}}]})
+
+    async def create_category(self, request):
+        self.posts += 1
+        data = (await request.json())["data"]
+        return web.json_response({"data": {"id": 2, "attributes": data}})
+
+    async def test_repeated_lookups_hit_memory(self):
+        course = M.Course(id=9, title="a")
+        with identity_map() as imap:
+            first, _ = await M.CourseCategory.get_or_create(name="existing")
+            second, _ = await M.CourseCategory.get_or_create(name="existing")
+            created, was_created = await M.CourseCategory.get_or_create(
+                name="new", course=course
+            )
+            again, _ = await M.CourseCategory.get_or_create(name="new", course=course)
+        self.assertIs(first, second)
+        self.assertTrue(was_created)
+        self.assertIs(created, again)
+        self.assertEqual((self.gets, self.posts), (2, 1))
+        self.assertEqual(imap.hits, 2)
+
+    async def test_lookups_with_lists_are_keyed_by_ids(self):
+        def authors():
+            return [M.Author(id=1, name="a"), M.Author(id=2, name="b")]
+
+        with identity_map() as imap:
+            created, _ = await M.CourseCategory.get_or_create(
+                name="new", authors=authors()
+            )
+            again, was_created = await M.CourseCategory.get_or_create(
+                name="new", authors=authors()
+            )
+            got = await M.CourseCategory.get(name="new", authors=authors())
+            self.assertIs(got, created)
+        self.assertIs(created, again)
+        self.assertFalse(was_created)
+        self.assertEqual((self.gets, self.posts), (1, 1))
+        self.assertEqual(imap.hits, 2)
+        self.assertEqual(
+            M.CourseCategory.lookup_key(authors=authors(), meta={"a": 1}),
+            (("authors", (1, 2)), ("meta", "{'a': 1}")),
+        )
+
+    async def test_hydration_returns_one_object_per_id(self):
+        payload = {"id": 5, "attributes": {"name": "a"}}
+        with identity_map():
+            a = M.Author(**payload)
+            a.name = "changed"
+            b = M.Author(id=5, attributes={"name": "b", "createdAt": "x"})
+        self.assertIs(a, b)
+        self.assertEqual(b.name, "changed")
+        self.assertEqual(b.createdAt, "x")
+        self.assertIsNot(M.Author(**payload), M.Author(**payload))
+
+    async def test_concurrent_get_or_create_is_coalesced(self):
+        course = M.Course(id=9, title="a")
+        results = await asyncio.gather(
+            *(
+                M.CourseCategory.get_or_create(name="new", course=course)
+                for _ in range(10)
+            )
+        )
+        self.assertEqual((self.gets, self.posts), (1, 1))
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_eviction(self):
+        imap = IdentityMap(max_size=2)
+        authors = [M.Author(id=i, attributes={"name": str(i)}) for i in range(3)]
+        for author in authors:
+            imap.add(author)
+        self.assertIsNone(imap.get(M.Author, 0))
+        self.assertIs(imap.get(M.Author, 2), authors[2])
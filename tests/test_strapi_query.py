@@ -0,0 +1,141 @@
+import unittest
+
+import strapi_models as M
+from strapi_query import Q, build_plan
+
+
+class TestQueryPlan(unittest.TestCase):
+    def test_projection(self):
+        params = build_plan(
+            M.PostCourseVideo, fields=["title"], populate={"video_file": ["url"]}
+        ).to_params()
+        self.assertEqual(
+            params,
+            {"fields[0]": "title", "populate[video_file][fields][0]": "url"},
+        )
+
+    def test_nested_projection(self):
+        params = build_plan(
+            M.CourseSubcategory,
+            populate=["name", {"course_category": {"course": ["title"]}}],
+        ).to_params()
+        self.assertEqual(
+            params,
+            {
+                "fields[0]": "name",
+                "populate[course_category][populate][course][fields][0]": "title",
+            },
+        )
+
+    def test_default_plan_breaks_cycles(self):
+        params = build_plan(M.Season).to_params()
+        self.assertIn("populate[post_course_videos][populate][video_file]", params)
+        for key in params:
+            self.assertNotIn("[populate][season]", key)
+
+    def test_default_plan_goes_as_deep_as_populate_deep(self):
+        params = build_plan(M.PostCourseVideo).to_params()
+        self.assertIn(
+            "populate[course_subcategory][populate][course_category]"
+            "[populate][course]",
+            params,
+        )
+
+    def test_populate_true_needs_a_relation(self):
+        with self.assertRaises(ValueError):
+            build_plan(M.PostCourseVideo, populate=True)
+        self.assertEqual(
+            build_plan(M.PostCourseVideo, populate={"video_file": True}).to_params(),
+            {"populate[video_file]": "true"},
+        )
+
+    def test_unknown_fields_are_rejected(self):
+        with self.assertRaises(ValueError):
+            build_plan(M.PostCourseVideo, fields=["nope"])
+        with self.assertRaises(ValueError):
+            build_plan(M.PostCourseVideo, fields=["video_file"])
+        with self.assertRaises(ValueError):
+            build_plan(M.PostCourseVideo, populate={"title": True})
+
+    def test_media_fields_use_strapi_names(self):
+        params = build_plan(
+            M.PostCourseVideo,
+            fields=["title"],
+            populate={"thumbnail": ["url", "formats", "provider_metadata"]},
+        ).to_params()
+        self.assertEqual(
+            params,
+            {
+                "fields[0]": "title",
+                "populate[thumbnail][fields][0]": "url",
+                "populate[thumbnail][fields][1]": "formats",
+                "populate[thumbnail][fields][2]": "provider_metadata",
+            },
+        )
+        for private in ("_formats", "_provider_metadata"):
+            with self.assertRaises(ValueError):
+                build_plan(M.PostCourseVideo, populate={"thumbnail": [private]})
+
+    def test_partial_media_hydrates(self):
+        obj = M.PostCourseVideo(
+            id=1,
+            attributes={
+                "title": "t",
+                "video_file": {"data": {"id": 2, "attributes": {"url": "/a.mp4"}}},
+            },
+        )
+        self.assertEqual(obj.video_file.url, "/a.mp4")
+        self.assertIsNone(obj.video_file.hash)
+
+
+    def test_sparse_objects_read_unloaded_fields_as_none(self):
+        def load():
+            return M.PostCourseVideo(id=1, attributes={"title": "t"})
+
+        obj = load()
+        self.assertIsNone(obj.video_file)
+        self.assertFalse(obj.is_set("video_file"))
+        self.assertTrue(obj.is_set("title"))
+        self.assertNotIn("video_file", repr(obj))
+        self.assertIn("title='t'", str(obj))
+        self.assertEqual(obj, load())
+        with self.assertRaises(AttributeError):
+            obj.nope
+
+
+class TestFilters(unittest.TestCase):
+    def test_lookups(self):
+        self.assertEqual(
+            Q(audio_file__id__null=True, video_file__url__endsWith=".mov").to_params(),
+            {
+                "filters[audio_file][id][$null]": "true",
+                "filters[video_file][url][$endsWith]": ".mov",
+            },
+        )
+
+    def test_default_operator_and_lists(self):
+        self.assertEqual(
+            Q(title="a", episode__in=[1, 2]).to_params(),
+            {
+                "filters[episode][$in][0]": "1",
+                "filters[episode][$in][1]": "2",
+                "filters[title][$eq]": "a",
+            },
+        )
+
+    def test_combinators(self):
+        q = (Q(episode__gt=1) | Q(episode__lt=0)) & ~Q(title__null=True)
+        self.assertEqual(
+            q.to_params(),
+            {
+                "filters[$and][0][$or][0][episode][$gt]": "1",
+                "filters[$and][0][$or][1][episode][$lt]": "0",
+                "filters[$and][1][$not][title][$null]": "true",
+            },
+        )
+
+    def test_relations_serialize_to_ids(self):
+        course = M.Course(id=4, title="x")
+        self.assertEqual(
+            Q(course=course).to_params(), {"filters[course][id][$eq]": "4"}
+        )
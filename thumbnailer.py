@@ -1,15 +1,16 @@
 import asyncio
-import os
 import subprocess
 from concurrent.futures import ThreadPoolExecutor
 
 import strapi_models as M
+from scratch import get_scratch
+from strapi_client import get_client
+from strapi_query import Q
 
 lock = asyncio.Semaphore(50)
 
 
-def extract_first_frame(video_url, video_id):
-    output_path = f"./thumbnails/temp-{video_id}.jpg"
+def extract_first_frame(video_url, output_path):
     ffmpeg_command = [
         "ffmpeg",
         "-y",
@@ -28,29 +29,34 @@ def extract_first_frame(video_url, video_id):
 async def process_video(video: M.PostCourseVideo, executor):
     loop = asyncio.get_running_loop()
     print(video.id)
-    frame_path = await loop.run_in_executor(
-        executor, extract_first_frame, video.video_file.url, video.id
-    )
-
-    video.first_frame = await M.Media.upload_file(frame_path)
+    async with get_scratch().job(f"frame-{video.id}", size=1024**2) as scratch:
+        frame_path = await loop.run_in_executor(
+            executor,
+            extract_first_frame,
+            video.video_file.url,
+            scratch.file("frame.jpg"),
+        )
+        video.first_frame = await M.Media.upload_file(frame_path)
     print("UPDATE", video.id)
     await video.put()
-    os.remove(frame_path)
     print(f"Processed video {video.id}")
 
 
 async def main():
-    print("Start processing videos")
-    all_videos = await M.PostCourseVideo.all()
-    print(f"got {len(all_videos)} videos")
-    all_videos = [i for i in all_videos if i.video_file and not i.first_frame]
-    print(f"{len(all_videos)} videos are missing first_frame")
-    with ThreadPoolExecutor() as executor:
-        tasks = [process_video(video, executor) for video in all_videos]
-        print("TASKS")
-        await asyncio.gather(*tasks)
-
-    print("Finished processing all videos")
+    async with get_client():
+        print("Start processing videos")
+        with ThreadPoolExecutor() as executor:
+            tasks = []
+            async for video in M.PostCourseVideo.iter(
+                fields=["title"],
+                populate={"video_file": ["url"], "first_frame": ["url"]},
+                filters=Q(first_frame__id__null=True, video_file__id__notNull=True),
+            ):
+                tasks.append(asyncio.create_task(process_video(video, executor)))
+            print(f"{len(tasks)} videos are missing first_frame")
+            await asyncio.gather(*tasks)
+
+        print("Finished processing all videos")
 
 
 if __name__ == "__main__":
@@ -4,6 +4,8 @@ from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 
 import strapi_models as M
+from strapi_client import get_client
+from strapi_query import Q
 from assembly_ai import transcribe as _transcribe
 
 assemblyai_concurent_limit = asyncio.Semaphore(5)
@@ -63,11 +65,17 @@ async def per_video(video: M.PostCourseVideo, executor):
 
 
 async def fetch_videos():
-    all_videos = await M.PostCourseVideo.all()
-    all_videos = [i for i in all_videos if i.video_file]
-    print(f"got {len(all_videos)} videos")
-    with ThreadPoolExecutor() as executor:
-        await asyncio.gather(*(per_video(video, executor) for video in all_videos))
+    async with get_client():
+        with ThreadPoolExecutor() as executor:
+            tasks = []
+            async for video in M.PostCourseVideo.iter(
+                fields=["title", "transcript"],
+                populate={"video_file": ["url"]},
+                filters=Q(video_file__id__notNull=True),
+            ):
+                tasks.append(asyncio.create_task(per_video(video, executor)))
+            print(f"got {len(tasks)} videos")
+            await asyncio.gather(*tasks)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+DEFAULT_PATH = os.getenv("UPLOAD_INDEX_PATH", "./upload_index.sqlite3")
+
+
+def file_digest(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadIndex:
+    # maps (content digest, size, strapi url) to the Media record strapi
+    # returned, so identical files are only ever uploaded once per server
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                base_url TEXT NOT NULL,
+                media TEXT NOT NULL,
+                uploaded_at REAL NOT NULL,
+                PRIMARY KEY (digest, size, base_url)
+            )
+            """
+        )
+        self.db.commit()
+
+    def lookup(self, digest: str, size: int, base_url: str) -> Optional[dict]:
+        row = self.db.execute(
+            "SELECT media FROM uploads WHERE digest = ? AND size = ? AND base_url = ?",
+            (digest, size, base_url),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record(self, digest: str, size: int, base_url: str, media: dict):
+        self.db.execute(
+            "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+            (digest, size, base_url, json.dumps(media), time.time()),
+        )
+        self.db.commit()
+
+    def forget(self, digest: str, size: int, base_url: str):
+        self.db.execute(
+            "DELETE FROM uploads WHERE digest = ? AND size = ? AND base_url = ?",
+            (digest, size, base_url),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+_default_index: Optional[UploadIndex] = None
+
+
+def get_index() -> UploadIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = UploadIndex()
+    return _default_index
+
+
+def set_index(index: Optional[UploadIndex]):
+    global _default_index
+    _default_index = index
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+import aiohttp
+from aiohttp.abc import AbstractStreamWriter
+
+ProgressCallback = Callable[[int, int], None]
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MIN_BYTES_PER_SEC = 256 * 1024
+STALL_TIMEOUT = 60
+
+
+class StalledUpload(Exception):
+    pass
+
+
+@dataclass
+class UploadMetrics:
+    file_path: str
+    size: int
+    seconds: float
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.size / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{os.path.basename(self.file_path)}: {self.size / 1e6:.1f} MB"
+            f" in {self.seconds:.1f}s ({self.bytes_per_sec / 1e6:.2f} MB/s)"
+        )
+
+
+class ThroughputEstimate:
+    # exponential moving average of observed upload speed, used to size the
+    # timeout of the next upload
+    def __init__(self, initial: float = 2 * 1024 * 1024, alpha: float = 0.3):
+        self.bytes_per_sec = initial
+        self.alpha = alpha
+
+    def observe(self, metrics: UploadMetrics):
+        if metrics.seconds > 0 and metrics.size > DEFAULT_CHUNK_SIZE:
+            self.bytes_per_sec = (
+                self.alpha * metrics.bytes_per_sec
+                + (1 - self.alpha) * self.bytes_per_sec
+            )
+
+    def timeout(self, size: int, safety: float = 3, floor: float = 60):
+        rate = max(self.bytes_per_sec, MIN_BYTES_PER_SEC)
+        return aiohttp.ClientTimeout(
+            total=floor + safety * size / rate,
+            sock_connect=30,
+        )
+
+
+throughput = ThroughputEstimate()
+
+
+class ProgressFilePayload(aiohttp.payload.Payload):
+    def __init__(
+        self,
+        file_path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        progress: Optional[ProgressCallback] = None,
+        stall_timeout: float = STALL_TIMEOUT,
+    ):
+        super().__init__(file_path, filename=os.path.basename(file_path))
+        self._size = os.path.getsize(file_path)
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.stall_timeout = stall_timeout
+
+    def decode(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        raise TypeError("file payloads are streamed, not decoded")
+
+    async def write(self, writer: AbstractStreamWriter):
+        loop = asyncio.get_running_loop()
+        sent = 0
+        with open(self.file_path, "rb") as f:
+            while chunk := await loop.run_in_executor(None, f.read, self.chunk_size):
+                try:
+                    await asyncio.wait_for(writer.write(chunk), self.stall_timeout)
+                except asyncio.TimeoutError:
+                    raise StalledUpload(
+                        f"no progress for {self.stall_timeout}s uploading"
+                        f" {self.file_path} ({sent}/{self._size} bytes sent)"
+                    )
+                sent += len(chunk)
+                if self.progress is not None:
+                    self.progress(sent, self._size)
+
+
+async def stream_upload(
+    client,
+    file_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[ProgressCallback] = None,
+    stall_timeout: float = STALL_TIMEOUT,
+) -> Tuple[list, UploadMetrics]:
+    payload = ProgressFilePayload(file_path, chunk_size, progress, stall_timeout)
+    with aiohttp.MultipartWriter("form-data") as form:
+        part = form.append_payload(payload)
+        part.set_content_disposition(
+            "form-data", name="files", filename=payload.filename
+        )
+    start = time.monotonic()
+    async with client.post(
+        "/api/upload",
+        data=form,
+        timeout=throughput.timeout(payload.size),
+    ) as response:
+        if response.status != 200:
+            raise Exception(f"{response.status} - {await response.text()}")
+        response_data = await response.json()
+    metrics = UploadMetrics(file_path, payload.size, time.monotonic() - start)
+    throughput.observe(metrics)
+    print(f"uploaded {metrics}")
+    return response_data, metrics
@@ -1,5 +1,6 @@
 import json
 import os
+from typing import Optional
 
 import requests
 import vimeo
@@ -33,6 +34,19 @@ def get_video_info(video_id):
     return best_file.get("link"), thumbnail_url
 
 
+def get_video_size(video_id) -> Optional[int]:
+    # size in bytes of the file download_video would fetch
+    response = client.get(f"https://api.vimeo.com/videos/{video_id}")
+    if response.status_code != 200:
+        return None
+    best_file = max(
+        response.json().get("download", []),
+        key=lambda x: int(x.get("height", 0)),
+        default=None,
+    )
+    return best_file.get("size") if best_file is not None else None
+
+
 def download_from_url(url, download_path):
     response = requests.get(url, stream=True)
     total_size = int(response.headers.get("content-length", 0))